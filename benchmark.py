@@ -0,0 +1,432 @@
+"""PDF検索システムのベンチマーク
+
+使い方:
+    python benchmark.py generate 出力フォルダー [--files 200] [--pages 5] [--seed 1]
+    python benchmark.py run [--corpus フォルダー] [--workers 0] [--tier deferred] [--output results.json]
+    python benchmark.py compare 以前の結果.json 今回の結果.json
+
+generate は乱数の種が同じなら毎回同じ内容のPDF（日本語・英語の本文と表）を作成する。
+run はインデックス作成の速度（ファイル/秒・ページ/秒・最大メモリ使用量）と、
+AND・OR・完全一致検索の所要時間（p50/p95/p99、キャッシュなし・あり）を測定してJSONで出力する。
+メモリ使用量を正しく測るため、run は generate とは別のプロセスで実行する。
+"""
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+from pathlib import Path
+from typing import List, Dict, Optional
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+RESULT_VERSION = 1
+
+JAPANESE_WORDS = [
+    "機器", "故障", "点検", "配線", "端子台", "制御盤", "電源", "保守", "交換", "手順",
+    "安全", "確認", "設定", "温度", "圧力", "警報", "記録", "試験", "部品", "仕様",
+    "取扱説明書", "保護回路", "絶縁抵抗", "接地", "定格電流", "運転", "停止", "異常", "表示", "調整"
+]
+ENGLISH_WORDS = [
+    "terminal", "block", "voltage", "current", "relay", "sensor", "module", "cable", "switch", "panel",
+    "maintenance", "inspection", "procedure", "warning", "alarm", "pressure", "temperature", "status",
+    "controller", "input", "output", "signal", "ground", "fuse", "motor", "pump", "valve", "meter"
+]
+
+# 各クエリ種別で測定する検索語（生成するコーパスの語彙から選ぶ）
+QUERY_SETS = {
+    "and": ["機器 故障", "制御盤 端子台", "terminal block", "relay voltage", "点検 手順 安全"],
+    "or": ["機器 OR pump", "絶縁抵抗 OR 接地", "alarm OR warning", "端子台 OR terminal"],
+    "exact": ["terminal", "保護回路", "maintenance", "定格電流"]
+}
+
+def load_pdf_search():
+    """pdf-search.py をモジュールとして読み込む（ファイル名にハイフンがあるためimportできない）"""
+    path = Path(__file__).parent / "pdf-search.py"
+    spec = importlib.util.spec_from_file_location("pdf_search", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["pdf_search"] = module  # 並列処理の子プロセスからワーカー関数を参照できるようにする
+    spec.loader.exec_module(module)
+    return module
+
+# Windowsなど子プロセスを新しく起動する環境でも、子プロセスがこのファイルを読み込んだ時点で
+# pdf_search が登録されているよう、モジュールの読み込み時に読み込んでおく
+pdf_search = load_pdf_search()
+
+class SimplePDFWriter:
+    """外部ライブラリを使わずにテキストと罫線だけのPDFを書き出す
+
+    フォントは埋め込まず、文字コードをそのままCIDとして使い（Identity-H）、
+    ToUnicodeでUnicodeに戻せるようにしている。表示用ではなくテキスト抽出の測定用。
+    """
+    PAGE_WIDTH = 595
+    PAGE_HEIGHT = 842
+
+    def __init__(self):
+        self.pages = []  # ページごとの描画命令
+
+    @staticmethod
+    def _hex(text: str) -> str:
+        # 基本多言語面の文字だけを2バイトのCIDとして書き出す
+        return "".join(f"{ord(c):04X}" for c in text if ord(c) <= 0xFFFF and not 0xD800 <= ord(c) <= 0xDFFF)
+
+    def add_page(self, lines: List[str], table: Optional[List[List[str]]] = None):
+        """本文の行と（あれば）罫線付きの表を1ページとして追加"""
+        ops = []
+        y = self.PAGE_HEIGHT - 60
+        for line in lines:
+            ops.append(f"BT /F1 10 Tf 50 {y} Td <{self._hex(line)}> Tj ET")
+            y -= 16
+        if table:
+            ops.extend(self._table_ops(table, y - 20))
+        self.pages.append("\n".join(ops).encode("ascii"))
+
+    def _table_ops(self, table: List[List[str]], top: int) -> List[str]:
+        cell_width, cell_height = 120, 20
+        rows, cols = len(table), len(table[0])
+        left, bottom = 50, top - rows * cell_height
+        ops = ["0.5 w"]
+        for r in range(rows + 1):
+            y = bottom + r * cell_height
+            ops.append(f"{left} {y} m {left + cols * cell_width} {y} l S")
+        for c in range(cols + 1):
+            x = left + c * cell_width
+            ops.append(f"{x} {bottom} m {x} {top} l S")
+        for r, row in enumerate(table):
+            for c, cell in enumerate(row):
+                x = left + c * cell_width + 4
+                y = top - (r + 1) * cell_height + 6
+                ops.append(f"BT /F1 9 Tf {x} {y} Td <{self._hex(cell)}> Tj ET")
+        return ops
+
+    @staticmethod
+    def _to_unicode_cmap() -> bytes:
+        ranges = [f"<{high:02X}00> <{high:02X}FF> <{high:02X}00>"
+                  for high in range(0x100) if not 0xD8 <= high <= 0xDF]
+        body = []
+        # bfrangeは1ブロック100件まで
+        for i in range(0, len(ranges), 100):
+            chunk = ranges[i:i + 100]
+            body.append(f"{len(chunk)} beginbfrange\n" + "\n".join(chunk) + "\nendbfrange")
+        return ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+                "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+                "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+                "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+                + "\n".join(body) +
+                "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend").encode("ascii")
+
+    def write(self, path: Path):
+        objects = []  # 番号は1から
+
+        def add(data: bytes) -> int:
+            objects.append(data)
+            return len(objects)
+
+        def stream(data: bytes) -> bytes:
+            return b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+
+        catalog = add(b"")  # 後で埋める
+        pages_obj = add(b"")
+        to_unicode = add(stream(self._to_unicode_cmap()))
+        descriptor = add(b"<< /Type /FontDescriptor /FontName /MS-Gothic /Flags 4 /FontBBox [0 -141 1000 859] "
+                         b"/ItalicAngle 0 /Ascent 859 /Descent -141 /CapHeight 700 /StemV 80 >>")
+        descendant = add(b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /MS-Gothic "
+                         b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                         b"/FontDescriptor %d 0 R /DW 1000 /CIDToGIDMap /Identity >>" % descriptor)
+        font = add(b"<< /Type /Font /Subtype /Type0 /BaseFont /MS-Gothic /Encoding /Identity-H "
+                   b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>" % (descendant, to_unicode))
+        page_ids = []
+        for content in self.pages:
+            content_id = add(stream(content))
+            page_ids.append(add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+                b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                % (pages_obj, self.PAGE_WIDTH, self.PAGE_HEIGHT, font, content_id)
+            ))
+        objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+        objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+        output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, data in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n" % number + data + b"\nendobj\n"
+        xref = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            output += b"%010d 00000 n \n" % offset
+        output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, catalog, xref)
+        Path(path).write_bytes(bytes(output))
+
+def generate_corpus(output_dir: Path, files: int = 200, pages: int = 5, seed: int = 1,
+                    subfolders: int = 4) -> Dict:
+    """ベンチマーク用のPDFを作成し、コーパスの内容（件数・ページ数・サイズ）を返す"""
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    def sentence() -> str:
+        if rng.random() < 0.5:
+            return "".join(rng.choice(JAPANESE_WORDS) + rng.choice(["の", "を", "が", "と", "、"])
+                           for _ in range(rng.randint(5, 12))) + "。"
+        return " ".join(rng.choice(ENGLISH_WORDS) for _ in range(rng.randint(6, 14))) + "."
+
+    total_pages = 0
+    total_bytes = 0
+    for i in range(files):
+        folder = output_dir / f"folder{i % subfolders}" if subfolders else output_dir
+        folder.mkdir(exist_ok=True)
+        writer = SimplePDFWriter()
+        page_count = rng.randint(1, pages * 2 - 1) if pages > 1 else 1
+        for _ in range(page_count):
+            lines = [sentence()[:45] for _ in range(rng.randint(20, 40))]
+            table = None
+            if rng.random() < 0.3:
+                table = [["品番", "名称", "数量", "status"]] + [
+                    [f"P-{rng.randint(1000, 9999)}", rng.choice(JAPANESE_WORDS),
+                     str(rng.randint(1, 50)), rng.choice(ENGLISH_WORDS)]
+                    for _ in range(rng.randint(2, 6))
+                ]
+            writer.add_page(lines, table)
+        path = folder / f"doc{i:05d}.pdf"
+        writer.write(path)
+        total_pages += page_count
+        total_bytes += path.stat().st_size
+
+    corpus = {"files": files, "pages": total_pages, "bytes": total_bytes, "seed": seed,
+              "max_pages": pages, "subfolders": subfolders}
+    with open(output_dir / "corpus.json", "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=4)
+    return corpus
+
+def peak_rss_mb() -> Optional[float]:
+    """このプロセスと終了済みの子プロセスの最大メモリ使用量（MB）"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource:
+        usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        # LinuxはKB、macOSはバイト単位
+        return round(usage / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    return None
+
+def percentile(values: List[float], percent: float) -> float:
+    """最近順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))  # 切り上げ
+    return ordered[int(rank) - 1]
+
+def summarize(latencies_ms: List[float]) -> Dict:
+    return {
+        "n": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 3)
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmark(corpus_dir: Path, db_dir: Path, workers: int = 0, tier: str = "deferred",
+                  repeat: int = 20) -> Dict:
+    """インデックス作成と検索の性能を測定"""
+    settings = pdf_search.Settings()
+    settings.settings = settings._get_default_settings()
+    settings.settings.update({
+        "pdf_folder": str(corpus_dir),
+        "db_folder": str(db_dir),
+        "exclude_patterns": [],
+        "include_subfolders_index": True,
+        "index_workers": workers,
+        "extraction_tier": tier,
+        "watch_folder": False
+    })
+
+    # インデックス作成
+    search_system = pdf_search.PDFSearchSystem(settings)
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    pdf_search.import_pdf_module(search_system)
+    elapsed = time.perf_counter() - start_time
+    cpu = time.process_time() - start_cpu
+    search_system.close()
+
+    conn = pdf_search.sqlite3.connect(str(search_system.db_path))
+    files = conn.execute("SELECT COUNT(*) FROM pdf_contents").fetchone()[0]
+    pages = conn.execute("SELECT COUNT(*) FROM pdf_pages WHERE page_no > 0").fetchone()[0]
+    conn.close()
+    indexing = {
+        "files": files,
+        "pages": pages,
+        "elapsed_seconds": round(elapsed, 3),
+        "cpu_seconds": round(cpu, 3),
+        "files_per_second": round(files / elapsed, 3) if elapsed > 0 else 0.0,
+        "pages_per_second": round(pages / elapsed, 3) if elapsed > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "db_bytes": search_system.db_path.stat().st_size,
+        "workers": search_system.index_workers,
+        "tier": tier
+    }
+
+    # 検索（キャッシュなし: 毎回検索結果のキャッシュを消す / キャッシュあり: 同じ検索を繰り返す）
+    search_system = pdf_search.PDFSearchSystem(settings)
+    queries = {}
+    try:
+        for kind, query_list in QUERY_SETS.items():
+            exact_match = kind == "exact"
+            measured = {"cold": [], "warm": []}
+            hits = {}
+            for original_query in query_list:
+                query = pdf_search.prepare_query(original_query, exact_match)
+                for _ in range(repeat):
+                    search_system.query_cache.clear()
+                    start_time = time.perf_counter()
+                    hits[original_query] = len(search_system.search(query, exact_match, True))
+                    measured["cold"].append((time.perf_counter() - start_time) * 1000)
+                for _ in range(repeat):
+                    start_time = time.perf_counter()
+                    search_system.search(query, exact_match, True)
+                    measured["warm"].append((time.perf_counter() - start_time) * 1000)
+            queries[kind] = {"cold": summarize(measured["cold"]), "warm": summarize(measured["warm"]),
+                             "hits": hits}
+    finally:
+        search_system.close()
+
+    return {
+        "version": RESULT_VERSION,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": pdf_search.sqlite3.sqlite_version,
+        "indexing": indexing,
+        "queries": queries
+    }
+
+def compare_results(old: Dict, new: Dict) -> List[str]:
+    """2つの測定結果を比較し、指標ごとの変化を1行ずつ返す（時間は小さいほど良い）"""
+    lines = []
+
+    def row(name: str, before, after, higher_is_better: bool):
+        if not before or after is None:
+            return
+        change = (after - before) / before * 100
+        better = change > 0 if higher_is_better else change < 0
+        mark = "改善" if better and abs(change) >= 5 else ("悪化" if abs(change) >= 5 else "")
+        lines.append(f"{name:<32} {before:>12} -> {after:>12} ({change:+.1f}%) {mark}")
+
+    for key, higher_is_better in (("files_per_second", True), ("pages_per_second", True),
+                                  ("elapsed_seconds", False), ("peak_rss_mb", False), ("db_bytes", False)):
+        row(f"indexing.{key}", old["indexing"].get(key), new["indexing"].get(key), higher_is_better)
+    for kind in new["queries"]:
+        for cache in ("cold", "warm"):
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                before = old.get("queries", {}).get(kind, {}).get(cache, {}).get(key)
+                row(f"{kind}.{cache}.{key}", before, new["queries"][kind][cache][key], False)
+    return lines
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="PDF検索システムのベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="ベンチマーク用のPDFを作成する")
+    generate_parser.add_argument("output", help="PDFを作成するフォルダー")
+    generate_parser.add_argument("--files", type=int, default=200, help="作成するPDFの数")
+    generate_parser.add_argument("--pages", type=int, default=5, help="1ファイルの平均ページ数")
+    generate_parser.add_argument("--subfolders", type=int, default=4, help="振り分けるサブフォルダーの数")
+    generate_parser.add_argument("--seed", type=int, default=1, help="乱数の種（同じなら同じ内容になる）")
+
+    run_parser = subparsers.add_parser("run", help="インデックス作成と検索の性能を測定する")
+    run_parser.add_argument("--corpus", help="測定に使うPDFフォルダー（省略時は一時フォルダーに作成）")
+    run_parser.add_argument("--files", type=int, default=200, help="--corpus省略時に作成するPDFの数")
+    run_parser.add_argument("--pages", type=int, default=5, help="--corpus省略時の平均ページ数")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--workers", type=int, default=0, help="テキスト抽出の並列プロセス数（0は自動）")
+    run_parser.add_argument("--tier", default="deferred", help="テキスト抽出の方式（fast / full / deferred）")
+    run_parser.add_argument("--repeat", type=int, default=20, help="1つの検索語を繰り返す回数")
+    run_parser.add_argument("--output", help="結果を保存するJSONファイル（省略時は標準出力）")
+
+    compare_parser = subparsers.add_parser("compare", help="2つの測定結果を比較する")
+    compare_parser.add_argument("old", help="以前の結果のJSONファイル")
+    compare_parser.add_argument("new", help="今回の結果のJSONファイル")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        corpus = generate_corpus(Path(args.output), args.files, args.pages, args.seed, args.subfolders)
+        print(json.dumps(corpus, ensure_ascii=False))
+        return 0
+
+    if args.command == "compare":
+        with open(args.old, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, "r", encoding="utf-8") as f:
+            new = json.load(f)
+        print(f"{old.get('commit')} -> {new.get('commit')}")
+        for line in compare_results(old, new):
+            print(line)
+        return 0
+
+    work_dir = Path(tempfile.mkdtemp(prefix="pdf-search-bench-"))
+    try:
+        corpus_dir = Path(args.corpus) if args.corpus else work_dir / "corpus"
+        if not args.corpus:
+            # 作成時のメモリ使用量が測定結果に混ざらないよう、別のプロセスで作成する
+            subprocess.run([sys.executable, __file__, "generate", str(corpus_dir), "--files", str(args.files),
+                            "--pages", str(args.pages), "--seed", str(args.seed)],
+                           check=True, stdout=subprocess.DEVNULL)
+        # 標準出力は結果のJSON用に空けておき、インデックス作成中のメッセージは標準エラーに出す
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            results = run_benchmark(corpus_dir, work_dir / "db", args.workers, args.tier, args.repeat)
+        finally:
+            sys.stdout = stdout
+        corpus_file = corpus_dir / "corpus.json"
+        if corpus_file.exists():
+            with open(corpus_file, "r", encoding="utf-8") as f:
+                results["corpus"] = json.load(f)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(results, ensure_ascii=False, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
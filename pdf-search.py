@@ -4,15 +4,260 @@ from pathlib import Path
 import sqlite3
 import time
 import tkinter as tk
-from tkinter import messagebox, ttk, filedialog
+from tkinter import messagebox, ttk, filedialog, font
 import threading
-from queue import Queue
-from typing import List, Dict, Optional
+import multiprocessing
+from queue import Queue, Empty
+from typing import List, Dict, Optional, NamedTuple
+from collections import OrderedDict, deque
 import re
 import sys
+import select
+import signal
+import struct
+import fnmatch
+import itertools
+import unicodedata
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+try:
+    from re import _parser as sre_parse  # Python 3.11以降
+except ImportError:
+    import sre_parse
+from urllib.parse import quote, urlencode, urlparse, parse_qs
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
+# FTS5のtrigramトークナイザーで検索できる最小文字数（これより短い語はLIKEで検索）
+FTS_MIN_TERM_LENGTH = 3
+
+# テキスト抽出の方式
+#   fast: pypdfで本文のテキストだけを抽出（高速）
+#   full: pdfplumberでレイアウトと表のテキストも抽出（低速）
+#   deferred: まずfastで登録して検索できるようにし、後からバックグラウンドでfullの内容に置き換える
+EXTRACTION_TIERS = ("fast", "full", "deferred")
+
+# 文字の正規化方式のバージョン（normalize_textを変更したら上げる。既存DBの本文は起動時に正規化し直す）
+NORMALIZATION_VERSION = 2
+
+# NFKCで統一されないハイフン・ダッシュ類と波ダッシュ・チルダ類の置き換え表
+# （長音記号「ー」は語の一部なので置き換えない）
+_NORMALIZE_TABLE = str.maketrans(
+    {**{ch: "-" for ch in "\u2010\u2012\u2013\u2014\u2015\u2212"},
+     **{ch: "~" for ch in "\u301c\u223c\u223e\u3030"}})
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def normalize_text(text: str, strip: bool = True, casefold: bool = True) -> str:
+    """検索用に文字を正規化（本文とクエリの両方に同じ処理をかける）
+
+    NFKCで全角・半角を統一し、大文字小文字を同一視（casefold）し、
+    ハイフン・波ダッシュ類を統一して、改行やタブを含む連続した空白を1つのスペースにまとめる。
+    strip=Falseのときは前後の空白を残す（完全一致検索で語の区切りを指定する場合）。
+    casefold=Falseのときは大文字小文字を残す（検索語から大文字の NEAR 演算子を見分ける場合）。
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    if casefold:
+        text = text.casefold()
+    text = text.translate(_NORMALIZE_TABLE)
+    text = _WHITESPACE_PATTERN.sub(" ", text)
+    return text.strip() if strip else text
+
+# 近接検索（A NEAR/n B）で距離を省略したときの文字数
+DEFAULT_NEAR_DISTANCE = 10
+# 近接検索の演算子（英単語の near と区別するため、大文字で書いたものだけを演算子とする）
+_NEAR_OPERATOR = re.compile(r"NEAR(?:/(\d+))?")
+
+class ProximityQuery(NamedTuple):
+    """近接検索の条件: termsの2語が、順序を問わずdistance文字以内の間隔で1つのページに現れる"""
+    terms: tuple
+    distance: int
+
+# 検索結果に含める文書情報の列
+DOCUMENT_INFO_COLUMNS = ("file_size", "page_count", "title", "author", "producer", "created")
+
+# 検索結果の絞り込みの条件（iter_searchのfiltersのキー → 値の種類）
+#   日付は "2024-04-01" "2024-04" "2024" などの形式かUNIX時刻で指定し、*_beforeはその日（月・年）を含む
+#   フォルダーはPDFフォルダーからの相対パスか絶対パスで指定し、サブフォルダーも含む
+SEARCH_FILTERS = {
+    "modified_after": "date", "modified_before": "date",
+    "created_after": "date", "created_before": "date",
+    "min_pages": "int", "max_pages": "int",
+    "min_size": "int", "max_size": "int",  # バイト
+    "folder": "text", "author": "text", "title": "text"
+}
+
+def _parse_filter_date(value, end: bool = False) -> float:
+    """絞り込みの日付をUNIX時刻に変換（endがTrueなら、その日・月・年の終わり（の次の瞬間））"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for date_format, period in (("%Y-%m-%d", "day"), ("%Y/%m/%d", "day"), ("%Y-%m", "month"),
+                                ("%Y/%m", "month"), ("%Y", "year")):
+        try:
+            moment = datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        if end:
+            if period == "day":
+                moment += timedelta(days=1)
+            elif period == "month":
+                moment = moment.replace(year=moment.year + moment.month // 12, month=moment.month % 12 + 1)
+            else:
+                moment = moment.replace(year=moment.year + 1)
+        return time.mktime(moment.timetuple())
+    raise ValueError(value)
+
+def normalize_search_filters(filters: Optional[Dict]) -> Dict:
+    """絞り込みの条件を検索に使う値に変換（空の条件は取り除き、正しくない条件はValueError）"""
+    normalized = {}
+    for key, value in (filters or {}).items():
+        kind = SEARCH_FILTERS.get(key)
+        if kind is None:
+            raise ValueError(f"不明な絞り込みの条件です: {key}")
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        try:
+            if kind == "date":
+                normalized[key] = _parse_filter_date(value, end=key.endswith("_before"))
+            elif kind == "int":
+                normalized[key] = int(value)
+            else:
+                normalized[key] = str(value).strip()
+                if key in ("author", "title"):
+                    # 保存した作成者・タイトルと同じ正規化をかけ、全角・半角や大文字小文字の違いを吸収する
+                    normalized[key] = metadata_search_key(normalized[key])
+        except (ValueError, OverflowError):
+            raise ValueError(f"絞り込みの条件が正しくありません: {key}={value}") from None
+    return normalized
+
+# パターン検索の種類（regex: 正規表現、wildcard: * と ? だけを使うワイルドカード）
+PATTERN_MODES = ("regex", "wildcard")
+
+# パターン検索の検索語の長さと、正規表現の後戻りの組み合わせの数の上限
+# （Pythonの正規表現は途中で止められないので、1ページの確認がいつまでも終わらないパターンは受け付けない）
+MAX_PATTERN_LENGTH = 200
+MAX_REGEX_COMBINATIONS = 10000
+# 上限のない繰り返し（* や + や {n,}）1つを、後戻りの組み合わせ何通りとして数えるか
+UNBOUNDED_REPEAT_COMBINATIONS = 1000
+
+def build_search_regex(query: str, pattern_mode: str) -> str:
+    """パターン検索の検索語を、正規化した本文に対して使う正規表現に変換（正しくない場合はValueError）
+
+    本文と同じ正規化をかけるが、\d や \W などのエスケープは大文字小文字の意味が違うためそのまま残す
+    """
+    if pattern_mode not in PATTERN_MODES:
+        raise ValueError(f"不明なパターン検索の種類です: {pattern_mode}")
+    if len(query.strip()) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"検索語が長すぎます（{MAX_PATTERN_LENGTH}文字まで）")
+    if pattern_mode == "wildcard":
+        # 先頭と末尾の * は部分一致では意味がないので除く。間の * は最後のもの以外、先読みと後方参照で
+        # 次の部分が最初に現れる位置に決め打ちし、* がいくつあっても後戻りが重ならないようにする
+        parts = ["".join("." if ch == "?" else re.escape(normalize_text(ch, strip=False)) for ch in segment)
+                 for segment in query.strip().split("*") if segment]
+        pattern = "".join(parts[:1]) + "".join(f"(?=(?P<s{i}>.*?{part}))(?P=s{i})"
+                                               for i, part in enumerate(parts[1:-1], 1))
+        if len(parts) > 1:
+            pattern += f".*{parts[-1]}"
+    else:
+        pattern = "".join(token if token.startswith("\\") else normalize_text(token, strip=False)
+                          for token in re.findall(r"\\.|[^\\]+|\\$", query.strip(), flags=re.DOTALL))
+    if not pattern:
+        # * だけのワイルドカードは空のパターンになり、すべてのページを確認してすべての文書に一致してしまう
+        raise ValueError("パターンに検索する文字を含めてください（* だけでは検索できません）")
+    try:
+        _compile_regex(pattern)
+    except re.error as e:
+        raise ValueError(f"正規表現が正しくありません: {e}") from e
+    if pattern_mode != "wildcard" and regex_combinations(pattern) > MAX_REGEX_COMBINATIONS:
+        raise ValueError("正規表現が複雑すぎます（上限のない繰り返し（* や +）は1つまでにし、"
+                         "ほかは {1,3} のように回数を決めてください）")
+    return pattern
+
+def regex_combinations(pattern: str) -> int:
+    """正規表現が1か所から一致を試すときの後戻りの組み合わせの数を見積もる
+
+    繰り返しはその回数の幅、選択（|）は選択肢の数だけ組み合わせが増えるものとして数える。
+    回数の決まっていない繰り返しの中の繰り返しや選択は、組み合わせが指数的に増えるので上限を超えたものとする
+    """
+    limit = MAX_REGEX_COMBINATIONS + 1
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None))
+
+    def count(items) -> int:
+        total = 1
+        for op, av in items:
+            if op in repeats:
+                low, high, body = av
+                inner = count(body)
+                if high == low:
+                    factor = inner ** min(low, 32)
+                elif inner > 1:
+                    return limit
+                elif high == sre_parse.MAXREPEAT:
+                    factor = UNBOUNDED_REPEAT_COMBINATIONS
+                else:
+                    factor = min(high - low + 1, UNBOUNDED_REPEAT_COMBINATIONS)
+            elif op is sre_parse.BRANCH:
+                factor = sum(count(branch) for branch in av[1])
+            elif op is sre_parse.SUBPATTERN:
+                factor = count(av[-1])
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                factor = count(av[1])
+            elif op is sre_parse.GROUPREF_EXISTS:
+                factor = count(av[1]) + (count(av[2]) if av[2] else 1)
+            elif op is getattr(sre_parse, "ATOMIC_GROUP", None):
+                factor = count(av)
+            else:
+                factor = 1
+            total = min(total * factor, limit)
+        return total
+
+    return count(sre_parse.parse(pattern))
+
+@lru_cache(maxsize=32)
+def _compile_regex(pattern: str):
+    return re.compile(pattern)
+
+def regexp_match(pattern: str, text: str) -> int:
+    """SQLiteの REGEXP 演算子（text REGEXP pattern）として登録する関数"""
+    return 1 if text and _compile_regex(pattern).search(text) else 0
+
+def required_literals(pattern: str) -> List[str]:
+    """正規表現に一致する文字列が必ず含む固定の文字列を取り出す（全文検索インデックスでの絞り込み用）
+
+    選択（|）や省略できる部分（? や *）の中の文字列は、含まれるとは限らないので使わない
+    """
+    literals = []
+
+    def collect(items):
+        current = []
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                current.append(chr(av))
+                continue
+            if current:
+                literals.append("".join(current))
+                current = []
+            if op is sre_parse.SUBPATTERN:
+                collect(av[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+                collect(av[2])
+            elif op is sre_parse.ASSERT and av[0] == 1:
+                collect(av[1])
+        if current:
+            literals.append("".join(current))
+
+    collect(sre_parse.parse(pattern))
+    return literals
+
 class Settings:
     def __init__(self):
         # アプリケーションと同じディレクトリにlast_config_path.jsonというファイルで
@@ -48,15 +293,16 @@ class Settings:
         except Exception as e:
             print(f"設定ファイルパスの保存に失敗: {e}")
 
-    def load_settings_from_file(self, file_path: str) -> bool:
-        """指定されたファイルから設定を読み込む"""
+    def load_settings_from_file(self, file_path: str, remember: bool = True) -> bool:
+        """指定されたファイルから設定を読み込む（rememberがFalseなら次回起動時のパスとして記録しない）"""
         file_path = Path(file_path)
         if file_path.exists():
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     self.settings = json.load(f)
                 self.settings_file = file_path
-                self._save_last_settings_path()  # 読み込んだパスを記録
+                if remember:
+                    self._save_last_settings_path()  # 読み込んだパスを記録
                 return True
             except Exception as e:
                 print(f"設定ファイルの読み込みに失敗: {e}")
@@ -97,7 +343,36 @@ class Settings:
             "pdf_folder": "",
             "db_folder": "",
             "exclude_patterns": ['除外したいテキスト1…', '除外したいテキスト2…'],
-            "include_subfolders_index": False
+            "include_subfolders_index": False,
+            "index_workers": 0,  # テキスト抽出の並列プロセス数（0は自動）
+            "worker_max_tasks": 50,  # 1つのワーカープロセスが処理するファイル数の上限
+            "commit_batch_files": 50,  # インデックス作成時にコミットする間隔（ファイル数）
+            "commit_batch_seconds": 30,  # インデックス作成時にコミットする間隔（秒）
+            "journal_mode": "WAL",
+            "extraction_tier": "deferred",  # テキスト抽出の方式（fast / full / deferred）
+            "extraction_policies": [],  # フォルダー・パターンごとの抽出方式 例: {"pattern": "図面/*", "tier": "full"}
+            "extract_max_seconds": 300,  # 1ファイルのテキスト抽出にかける時間の上限（0は無制限）
+            "extract_max_pages": 2000,  # 1ファイルから抽出するページ数の上限（0は無制限）
+            "extract_max_memory_mb": 2048,  # テキスト抽出中のプロセスのメモリ使用量の上限（0は無制限）
+            "watch_folder": True,  # 起動中もPDFフォルダーを監視してインデックスを更新する
+            "watch_mode": "auto",  # auto / inotify / poll
+            "watch_debounce_seconds": 2,
+            "watch_poll_interval": 60,  # 定期的な走査で監視する場合の間隔（秒）
+            "read_connections": 4,  # 検索用に保持する読み取り接続の数
+            "read_mmap_size_mb": 256,
+            "read_cache_size_mb": 64,
+            "query_cache_entries": 64,  # 検索結果のキャッシュに保持する件数
+            "query_cache_mb": 64,  # 検索結果のキャッシュに使うメモリの上限
+            "search_result_limit": 1000,  # 検索結果の件数の上限（関連度の高い順）
+            "search_as_you_type": False,  # 入力中に検索する
+            "search_as_you_type_delay_ms": 300,  # 入力が止まってから検索を始めるまでの時間
+            "rank_filename_boost": 1.0,  # ファイル名に検索語を含む場合の加点（1語ごと）
+            "rank_recency_boost": 0.3,  # 新しいファイルの加点
+            "rank_recency_half_life_days": 365,  # 新しさの加点が半分になるまでの日数
+            "maintenance_interval_hours": 24,  # インデックスDBのメンテナンスの間隔（0はmaintainコマンドでのみ実行）
+            "server_url": "",  # 検索サーバーのURL（空欄ならこのPCでインデックスを作成・検索）
+            "server_host": "127.0.0.1",  # 検索サーバーとして起動する場合の待ち受けアドレス
+            "server_port": 8765
         }
 
     def save_settings(self):
@@ -216,11 +491,57 @@ class ConfigDialog(tk.Toplevel):
             variable=self.include_subfolders_index_var
         ).pack(side=tk.LEFT)
 
+        # テキスト抽出の並列プロセス数
+        worker_frame = ttk.Frame(main_frame)
+        worker_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(worker_frame, text="テキスト抽出の並列プロセス数（0は自動）:").pack(side=tk.LEFT)
+        self.index_workers_var = tk.IntVar(value=self.settings.get_setting("index_workers") or 0)
+        ttk.Spinbox(
+            worker_frame,
+            from_=0,
+            to=os.cpu_count() or 1,
+            width=5,
+            textvariable=self.index_workers_var
+        ).pack(side=tk.LEFT, padx=5)
+
+        # テキスト抽出の方式
+        tier_frame = ttk.Frame(main_frame)
+        tier_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(tier_frame, text="テキスト抽出の方式:").pack(side=tk.LEFT)
+        self.tier_labels = {
+            "deferred": "高速に登録し、後から表・レイアウトを追加",
+            "fast": "高速（本文のテキストのみ）",
+            "full": "表・レイアウトを含めて抽出（低速）"
+        }
+        current_tier = self.settings.get_setting("extraction_tier")
+        self.extraction_tier_var = tk.StringVar(
+            value=self.tier_labels.get(current_tier, self.tier_labels["deferred"])
+        )
+        ttk.Combobox(
+            tier_frame,
+            textvariable=self.extraction_tier_var,
+            values=list(self.tier_labels.values()),
+            state="readonly",
+            width=40
+        ).pack(side=tk.LEFT, padx=5)
+
+        # 検索サーバー
+        server_frame = ttk.LabelFrame(main_frame, text="検索サーバーのURL（空欄ならこのPCでインデックスを作成）", padding="5")
+        server_frame.pack(fill=tk.X, pady=5)
+
+        self.server_url_var = tk.StringVar(value=self.settings.get_setting("server_url") or "")
+        ttk.Entry(server_frame, textvariable=self.server_url_var).pack(fill=tk.X, expand=True)
+
         # 説明テキスト
         help_text = """
 ・PDFフォルダー: 検索対象のPDFファイルが格納されているフォルダーを選択してください。
 ・インデックスDBフォルダー: 検索用のインデックスファイルを保存するフォルダーを選択してください。
 ・検索除外テキスト: ファイル名にこれらのテキストが含まれる場合、検索対象から除外されます。
+・並列プロセス数: インデックス作成時にPDFのテキスト抽出を行うプロセスの数です。0にするとCPUのコア数に合わせて自動で決まります。
+・テキスト抽出の方式: フォルダーごとに変える場合は、設定ファイルの extraction_policies に記述してください。
+・検索サーバー: 「pdf-search.py serve」で起動したサーバーのURL（例: http://192.168.0.10:8765）を入力すると、インデックスの作成と検索をサーバーに任せます。
 ※ 共有フォルダーのパスは、\\\\サーバー名\\フォルダー名 の形式で入力することもできます。
 """
         help_label = ttk.Label(main_frame, text=help_text, wraplength=550, justify=tk.LEFT)
@@ -310,12 +631,414 @@ class ConfigDialog(tk.Toplevel):
         self.settings.update_setting("db_folder", db_folder)
         self.settings.update_setting("exclude_patterns", exclude_patterns)
         self.settings.update_setting("include_subfolders_index", self.include_subfolders_index_var.get())
+        try:
+            self.settings.update_setting("index_workers", self.index_workers_var.get())
+        except tk.TclError:
+            self.settings.update_setting("index_workers", 0)  # 数値以外が入力された場合は自動
+        for tier, label in self.tier_labels.items():
+            if label == self.extraction_tier_var.get():
+                self.settings.update_setting("extraction_tier", tier)
+        self.settings.update_setting("server_url", self.server_url_var.get().strip())
 
         if self.callback:
             self.callback()
         
         self.destroy()
 
+class VirtualResultList(tk.Frame):
+    """検索結果のファイル名リスト（画面に見えている行だけをListboxに描画する）
+
+    結果が何件あってもListboxに入れるのは表示できる行数分だけなので、
+    件数が増えても追加・スクロールの速さとメモリ使用量はほとんど変わらない。
+    行を選択すると <<ResultSelect>>、ダブルクリックかEnterキーで <<ResultOpen>> を発生させる。
+    """
+
+    def __init__(self, parent, **listbox_options):
+        super().__init__(parent)
+        self.items = []  # 検索結果（ファイル名などの軽い情報だけ）
+        self.offset = 0  # 表示している先頭の行
+        self.rows = 1  # 表示できる行数
+        self.selected = None  # 選択している行（結果全体での位置）
+        self._render_pending = False
+
+        self.listbox = tk.Listbox(self, exportselection=False, **listbox_options)
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self.scrollbar = tk.Scrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.listbox.bind('<Configure>', self._on_configure)
+        self.listbox.bind('<<ListboxSelect>>', self._on_listbox_select)
+        self.listbox.bind('<MouseWheel>', self._on_mousewheel)
+        self.listbox.bind('<Button-4>', lambda event: self._scroll_to(self.offset - 3))
+        self.listbox.bind('<Button-5>', lambda event: self._scroll_to(self.offset + 3))
+        self.listbox.bind('<Up>', lambda event: self._move_selection(-1))
+        self.listbox.bind('<Down>', lambda event: self._move_selection(1))
+        self.listbox.bind('<Prior>', lambda event: self._move_selection(-self.rows))
+        self.listbox.bind('<Next>', lambda event: self._move_selection(self.rows))
+        self.listbox.bind('<Home>', lambda event: self._move_selection(-len(self.items)))
+        self.listbox.bind('<End>', lambda event: self._move_selection(len(self.items)))
+        self.listbox.bind('<Return>', lambda event: self.event_generate('<<ResultOpen>>'))
+        self.listbox.bind('<Double-Button-1>', lambda event: self.event_generate('<<ResultOpen>>'))
+
+    def clear(self):
+        self.items = []
+        self.offset = 0
+        self.selected = None
+        self._render()
+
+    def append(self, item: Dict):
+        """結果を追加（表示範囲に入る場合だけ描画し直す）"""
+        self.items.append(item)
+        if len(self.items) <= self.offset + self.rows:
+            self._schedule_render()
+        else:
+            self._update_scrollbar()
+
+    def size(self) -> int:
+        return len(self.items)
+
+    def selected_item(self) -> Optional[Dict]:
+        if self.selected is None or self.selected >= len(self.items):
+            return None
+        return self.items[self.selected]
+
+    def _schedule_render(self):
+        # 結果が続けて追加される場合は、まとめて1回だけ描画する
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        """表示範囲の行だけをListboxに入れ直す"""
+        self._render_pending = False
+        self.listbox.delete(0, tk.END)
+        visible = self.items[self.offset:self.offset + self.rows]
+        if visible:
+            self.listbox.insert(tk.END, *(item['file_name'] for item in visible))
+        if self.selected is not None and self.offset <= self.selected < self.offset + len(visible):
+            self.listbox.selection_set(self.selected - self.offset)
+            self.listbox.activate(self.selected - self.offset)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.items)
+        if total <= self.rows:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / total, min((self.offset + self.rows) / total, 1))
+
+    def _scroll_to(self, offset: int):
+        offset = max(0, min(offset, len(self.items) - self.rows))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+        return "break"
+
+    def _on_configure(self, event=None):
+        # 行の高さからウィンドウの大きさに合わせた行数を求める
+        line_height = max(font.Font(font=self.listbox.cget('font')).metrics('linespace'), 1)
+        border = int(self.listbox.cget('borderwidth')) + int(self.listbox.cget('highlightthickness'))
+        rows = max((self.listbox.winfo_height() - border * 2) // line_height, 1)
+        if rows != self.rows:
+            self.rows = rows
+            self._scroll_to(self.offset)
+            self._render()
+
+    def _on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self._scroll_to(int(float(args[1]) * len(self.items)))
+        elif args[0] == 'scroll':
+            step = self.rows if args[2] == 'pages' else 1
+            self._scroll_to(self.offset + int(args[1]) * step)
+
+    def _on_mousewheel(self, event):
+        return self._scroll_to(self.offset - (event.delta // 120 or (1 if event.delta > 0 else -1)) * 3)
+
+    def _on_listbox_select(self, event=None):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.offset + selection[0]
+            self.event_generate('<<ResultSelect>>')
+
+    def _move_selection(self, step: int):
+        """キー操作で選択を移動し、必要ならスクロールする"""
+        if not self.items:
+            return "break"
+        current = self.selected if self.selected is not None else -1
+        self.selected = max(0, min(current + step, len(self.items) - 1))
+        if self.selected < self.offset:
+            self.offset = self.selected
+        elif self.selected >= self.offset + self.rows:
+            self.offset = self.selected - self.rows + 1
+        self._render()
+        self.event_generate('<<ResultSelect>>')
+        return "break"
+
+class ReadConnectionPool:
+    """検索用の読み取り専用SQLite接続を使い回すプール
+
+    検索のたびに接続を開くと、DBファイルのオープン・スキーマの解析・キャッシュの読み直しが
+    毎回発生するため、開いた接続をプールに戻して再利用する。
+    DBファイルが置き換えられた場合は、古い接続を破棄して開き直す。
+    """
+
+    def __init__(self, db_path: Path, max_connections: int = 4,
+                 mmap_size_mb: int = 256, cache_size_mb: int = 64):
+        self.db_path = Path(db_path)
+        self.max_connections = max_connections
+        self.mmap_size = mmap_size_mb * 1024 * 1024
+        self.cache_size_kb = cache_size_mb * 1024
+        self._idle = Queue()
+        self._lock = threading.Lock()
+        self._file_id = None
+        self._generation = 0  # DBファイルを開き直した回数
+        self._connection_generation = {}
+
+    def _get_file_id(self):
+        """DBファイルが置き換えられたことを検出するための識別子"""
+        stat = os.stat(self.db_path)
+        # Windowsではst_ctimeが作成日時になるため、置き換えの検出に使える
+        return (stat.st_dev, stat.st_ino, stat.st_ctime if os.name == "nt" else None)
+
+    def _open(self) -> sqlite3.Connection:
+        """読み取り専用・メモリマップ・大きめのページキャッシュで接続を開く"""
+        path = str(self.db_path.resolve()).replace("\\", "/")
+        uri = "file://" + ("" if path.startswith("/") else "/") + quote(path, safe="/:") + "?mode=ro"
+        try:
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        except sqlite3.OperationalError:
+            # 読み取り専用で開けない環境では通常の接続を書き込み禁止にして使う
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute(f"PRAGMA cache_size = {-self.cache_size_kb}")
+        # パターン検索で、全文検索インデックスで絞り込んだページだけを正規表現で確認する
+        conn.create_function("regexp", 2, regexp_match, deterministic=True)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """プールから接続を取り出す（空いていなければ新しく開く）"""
+        file_id = self._get_file_id()
+        with self._lock:
+            if file_id != self._file_id:
+                if self._file_id is not None:
+                    print("インデックスDBが置き換えられたため、接続を開き直します")
+                self._close_idle()
+                self._file_id = file_id
+                self._generation += 1
+
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            conn = self._open()
+            with self._lock:
+                self._connection_generation[id(conn)] = self._generation
+            return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """接続をプールに戻す（DBファイルが置き換えられた後の古い接続は閉じる）"""
+        with self._lock:
+            current = self._connection_generation.get(id(conn)) == self._generation
+            keep = current and self._idle.qsize() < self.max_connections
+            if not keep:
+                self._connection_generation.pop(id(conn), None)
+        if keep:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def _close_idle(self):
+        """プール内の空いている接続をすべて閉じる"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            self._connection_generation.pop(id(conn), None)
+            conn.close()
+
+    def close(self):
+        """プールを閉じる"""
+        with self._lock:
+            self._close_idle()
+            self._generation += 1  # 使用中の接続は返却時に閉じる
+
+class SnippetEngine:
+    """検索結果のコンテキスト（キーワード前後のテキスト）を作成する
+
+    キーワードは検索ごとに1つの正規表現にまとめてコンパイルし、テキストを1回走査するだけで
+    すべてのキーワードの位置を求める。近い位置の切り出し範囲はまとめ、強調表示する位置も返す。
+    """
+
+    SEPARATOR = "\n...\n"
+
+    def __init__(self, keywords: List[str], window: int = 100):
+        self.window = window
+        # 長いキーワードを優先して一致させる（「故障」と「故障診断」など）
+        unique_keywords = sorted({k for k in keywords if k}, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(k) for k in unique_keywords),
+                                  re.IGNORECASE) if unique_keywords else None
+        self.regex = None  # パターン検索の正規表現（SQLのREGEXPでページを探すときに使う）
+
+    @classmethod
+    def from_regex(cls, pattern: str, window: int = 100) -> "SnippetEngine":
+        """パターン検索用: キーワードの代わりに正規表現に一致した位置を強調表示する"""
+        engine = cls([], window)
+        engine.pattern = _compile_regex(pattern)
+        engine.regex = pattern
+        return engine
+
+    def find(self, text: str) -> List[tuple]:
+        """テキスト中のすべてのキーワードの位置 (開始, 終了) を1回の走査で求める"""
+        if not self.pattern or not text:
+            return []
+        return [match.span() for match in self.pattern.finditer(text) if match.end() > match.start()]
+
+    def extract(self, text: str, max_windows: int = 5):
+        """テキストからキーワード前後の範囲を切り出し、(コンテキスト, 強調表示する位置) を返す"""
+        windows = [(max(start - self.window, 0), min(end + self.window, len(text)))
+                   for start, end in self.find(text)]
+        fragments = [(0, start, text[start:end]) for start, end in self._merge_ranges(windows)[:max_windows]]
+        if not fragments:
+            return text[:self.window * 2], []
+        return self.build(fragments)
+
+    def build(self, fragments: List[tuple]):
+        """(ページ番号, 開始位置, テキスト) の切り出し範囲をまとめ、(コンテキスト, 強調表示する位置) を返す
+
+        同じページで重なる・隣接する範囲は1つにまとめてから連結する
+        """
+        merged = []
+        for page_no, start, text in sorted(fragments, key=lambda f: (f[0], f[1])):
+            if merged and merged[-1][0] == page_no and start <= merged[-1][1] + len(merged[-1][2]):
+                prev_page, prev_start, prev_text = merged[-1]
+                overlap = prev_start + len(prev_text) - start
+                merged[-1] = (prev_page, prev_start, prev_text + text[overlap:])
+            else:
+                merged.append((page_no, start, text))
+
+        parts = []
+        highlights = []
+        offset = 0
+        for _, _, text in merged:
+            if parts:
+                offset += len(self.SEPARATOR)
+            highlights.extend((offset + start, offset + end) for start, end in self.find(text))
+            parts.append(text)
+            offset += len(text)
+        return self.SEPARATOR.join(parts), highlights
+
+    @staticmethod
+    def _merge_ranges(ranges: List[tuple]) -> List[tuple]:
+        """重なる・隣接する範囲をまとめる（rangesは開始位置の順）"""
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+class QueryCache:
+    """検索結果のLRUキャッシュ
+
+    件数とおおよそのメモリ使用量の両方で上限を設け、古く使われていないものから破棄する。
+    キーにはインデックスの世代番号を含め、インデックスが更新されたら古い結果は使わない。
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # キー -> (検索結果, 推定サイズ)
+        self._lock = threading.Lock()
+        self._generation = None
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, exact_match: bool, include_subfolders: bool, generation: int,
+                 limit: int = 0, details: bool = True, pattern_mode: str = "",
+                 filters: Optional[Dict] = None) -> tuple:
+        """正規化した検索語・検索オプション・件数の上限・詳細の有無・インデックスの世代番号からキーを作成"""
+        if pattern_mode:
+            # 正規表現は変換済み（\d と \D のように大文字小文字で意味が違うため、ここでは正規化しない）
+            normalized = query
+        else:
+            # 完全一致では前後のスペースにも意味があるため、連続した空白だけをまとめる。
+            # 大文字の NEAR だけが演算子なので、大文字小文字は区別したままにする
+            normalized = normalize_text(query, strip=not exact_match, casefold=False)
+        return (normalized, bool(exact_match), bool(include_subfolders), limit, bool(details),
+                pattern_mode, tuple(sorted((filters or {}).items())), generation)
+
+    @staticmethod
+    def _estimate_size(results: List[Dict]) -> int:
+        """検索結果が使うおおよそのメモリ量（バイト）"""
+        size = sys.getsizeof(results)
+        for result in results:
+            size += sys.getsizeof(result)
+            size += sum(sys.getsizeof(value) for value in result.values())
+        return size
+
+    def _invalidate_old_generation(self, generation: int):
+        """インデックスが更新されていたら、以前の世代の結果をすべて破棄"""
+        if generation == self._generation:
+            return
+        self._generation = generation
+        for key in [key for key in self._entries if key[-1] != generation]:
+            _, size = self._entries.pop(key)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def get(self, key: tuple) -> Optional[List[Dict]]:
+        """キャッシュされた検索結果を取得（無ければNone）"""
+        with self._lock:
+            self._invalidate_old_generation(key[-1])
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, results: List[Dict]):
+        """検索結果をキャッシュし、上限を超えた分を古い順に破棄"""
+        size = self._estimate_size(results)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._invalidate_old_generation(key[-1])
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (results, size)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """キャッシュをすべて破棄"""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict:
+        """キャッシュの利用状況（ヒット・ミス・破棄の回数など）"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "generation": self._generation
+            }
+
 class PDFSearchSystem:
     def __init__(self, settings: Settings):
         self.settings = settings
@@ -323,269 +1046,2371 @@ class PDFSearchSystem:
         self.db_path = Path(self.settings.get_setting("db_folder")) / "pdf_index.db"
         self.exclude_patterns = self.settings.get_setting("exclude_patterns")
         self.include_subfolders_index = self.settings.get_setting("include_subfolders_index")
+        self.index_workers = resolve_worker_count(self.settings.get_setting("index_workers"))
+        self.worker_max_tasks = self.settings.get_setting("worker_max_tasks") or 50
+        self.commit_batch_files = self.settings.get_setting("commit_batch_files") or 50
+        extraction_tier = self.settings.get_setting("extraction_tier")
+        self.extraction_tier = extraction_tier if extraction_tier in EXTRACTION_TIERS else "deferred"
+        self.extraction_policies = self.settings.get_setting("extraction_policies") or []
+        self.commit_batch_seconds = self.settings.get_setting("commit_batch_seconds") or 30
+        # 1ファイルあたりの抽出の上限（超えたファイルは一部だけ登録、または登録を見送り、次回以降は再抽出しない）
+        # （設定ファイルに無い場合は既定の上限、0は無制限）
+        self.extraction_limits = {}
+        for key, setting, default in (("max_seconds", "extract_max_seconds", 300),
+                                      ("max_pages", "extract_max_pages", 2000),
+                                      ("max_memory_mb", "extract_max_memory_mb", 2048)):
+            value = self.settings.get_setting(setting)
+            self.extraction_limits[key] = default if value is None else value
         self.base_path = Path(self.folder_path)
         self.indexing_complete = threading.Event()
+        self.stop_requested = threading.Event()  # インデックス作成の中断要求
+        self.change_report = None  # 直近の変更検出の結果（追加・変更・削除されたファイル）
+        watch_folder = self.settings.get_setting("watch_folder")
+        self.watch_folder = True if watch_folder is None else bool(watch_folder)
         self.indexing_progress = {
             "total": 0, 
             "current": 0,
-            "status": "インデックス作成の準備中..."  # 状態メッセージを追加
+            "status": "インデックス作成の準備中...",  # 状態メッセージを追加
+            "rate": 0.0,  # テキスト抽出の処理速度（件/秒）
+            "eta_seconds": None  # 残り時間の見込み
         }
-        # クエリ結果のキャッシュを追加
-        self._query_cache = {}
-        self._cache_timeout = 300  # 5分
-
-    def _normalize_text(self, text: str) -> str:
-        """抽出したテキストを正規化"""
-        if not text:
-            return ""
-            
-        text = re.sub(r'\r\n|\r|\n', '\n', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = text.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-        text = text.replace('〜', '～').replace('−', '-')
-        
-        return text.strip()
+        # 検索結果の並べ替え（関連度に、ファイル名と更新日時による加点を掛け合わせる）
+        self.result_limit = self.settings.get_setting("search_result_limit") or 1000
+        filename_boost = self.settings.get_setting("rank_filename_boost")
+        self.rank_filename_boost = 1.0 if filename_boost is None else float(filename_boost)
+        recency_boost = self.settings.get_setting("rank_recency_boost")
+        self.rank_recency_boost = 0.3 if recency_boost is None else float(recency_boost)
+        self.rank_recency_half_life_days = self.settings.get_setting("rank_recency_half_life_days") or 365
+        # インデックスDBのメンテナンスの間隔（0は自動では行わない）
+        maintenance_interval = self.settings.get_setting("maintenance_interval_hours")
+        self.maintenance_interval_hours = 24 if maintenance_interval is None else float(maintenance_interval)
+        # 検索用の読み取り接続は使い回す
+        self.read_pool = ReadConnectionPool(
+            self.db_path,
+            max_connections=self.settings.get_setting("read_connections") or 4,
+            mmap_size_mb=self.settings.get_setting("read_mmap_size_mb") or 256,
+            cache_size_mb=self.settings.get_setting("read_cache_size_mb") or 64
+        )
+        # クエリ結果のキャッシュ（インデックスが更新されたら無効になる）
+        self.query_cache = QueryCache(
+            max_entries=self.settings.get_setting("query_cache_entries") or 64,
+            max_bytes=(self.settings.get_setting("query_cache_mb") or 64) * 1024 * 1024
+        )
+        # 子プロセスでインデックスを作成する場合のプロセスと中断要求
+        self._indexer_process = None
+        self._indexer_stop = None
+
+    def start_background_indexing(self):
+        """インデックス作成とフォルダー監視を子プロセスで開始する
+
+        pdfplumberの抽出やDBへの書き込みが画面側のプロセスのGILを占有しないよう、別プロセスで実行する。
+        進捗と完了はキューで受け取り、indexing_progress と indexing_complete に反映する。
+        検索はこのプロセスから、コミット済みのインデックスに対してそのまま行える
+        """
+        progress_queue = multiprocessing.Queue()
+        self._indexer_stop = multiprocessing.Event()
+        # ワーカープロセスを起動できるよう、デーモンプロセスにはしない（終了時はclose()で止める）
+        self._indexer_process = multiprocessing.Process(
+            target=_indexing_process_main,
+            args=(dict(self.settings.settings), progress_queue, self._indexer_stop),
+            name="pdf-search-indexer"
+        )
+        self._indexer_process.start()
+        threading.Thread(target=self._receive_progress, args=(self._indexer_process, progress_queue),
+                         daemon=True).start()
+
+    def _receive_progress(self, process, progress_queue):
+        """子プロセスから送られた進捗を反映する（子プロセスが終了したら完了扱いにする）"""
+        while True:
+            try:
+                kind, data = progress_queue.get(timeout=0.5)
+            except Empty:
+                if process.is_alive():
+                    continue
+                break
+            if kind == "progress":
+                self.indexing_progress.update(data)
+            elif kind == "complete":
+                self.indexing_complete.set()
+        self.indexing_complete.set()
+
+    def stop_indexing(self):
+        """インデックス作成とフォルダー監視を中断"""
+        self.stop_requested.set()
+        if self._indexer_stop is not None:
+            self._indexer_stop.set()
+
+    def close(self):
+        """インデックス作成を中断し、検索用の接続を閉じる"""
+        self.stop_indexing()
+        if self._indexer_process is not None:
+            # 子プロセスは処理済みの分をコミットしてから終了する
+            self._indexer_process.join(timeout=10)
+            if self._indexer_process.is_alive():
+                self._indexer_process.terminate()
+            self._indexer_process = None
+        self.read_pool.close()
+
+    def extraction_tier_for(self, file_path: str) -> str:
+        """ファイルに適用するテキスト抽出の方式を、フォルダー・パターンごとの設定から決定"""
+        try:
+            relative_path = Path(file_path).relative_to(self.base_path).as_posix()
+        except ValueError:
+            relative_path = Path(file_path).as_posix()
+        file_name = Path(file_path).name
+
+        # 先に一致したものを優先（例: {"pattern": "図面/*", "tier": "full"}）
+        for policy in self.extraction_policies:
+            pattern = policy.get("pattern", "")
+            tier = policy.get("tier")
+            if tier in EXTRACTION_TIERS and pattern and (
+                    fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(file_name, pattern)):
+                return tier
+        return self.extraction_tier
+
+    def should_exclude_file(self, file_path: Path) -> bool:
+        """ファイルを検索対象から除外すべきかを判定"""
+        filename = normalize_text(file_path.stem)
+        return any(normalize_text(pattern) in filename for pattern in self.exclude_patterns)
+
+    def _get_index_generation(self, cursor) -> int:
+        """インデックスの世代番号（インデックス作成がコミットするたびに増える）を取得"""
+        try:
+            cursor.execute("SELECT value FROM index_state WHERE key = 'generation'")
+        except sqlite3.OperationalError:
+            return 0  # index_stateテーブルが無い以前のDB
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _table_exists(self, cursor, name: str) -> bool:
+        """テーブル（FTS5の全文検索インデックスを含む）が存在するかを判定"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+        return cursor.fetchone() is not None
 
-    def _extract_context(self, content: str, query: str, exact_match: bool) -> str:
-        """検索結果のコンテキストを抽出"""
+    @staticmethod
+    def _fts_phrase(term: str) -> str:
+        """語をFTS5のフレーズ（部分一致）として扱えるようにクォート"""
+        return '"' + term.replace('"', '""') + '"'
+
+    @staticmethod
+    def _parse_query(query: str, exact_match: bool):
+        """検索語をキーワードのリストと結合方法（AND/OR）に分解し、キーワードは本文と同じ正規化をかける
+
+        "..." で囲んだ部分はスペースを含む1つのフレーズとし、A NEAR/n B はProximityQueryにまとめる
+        """
         if exact_match:
-            match = re.search(f".{{0,100}}{re.escape(query)}.{{0,100}}", content)
-            if match:
-                return match.group(0)
+            # 1語の場合は前後にスペースが追加済みのqueryをそのまま1つのフレーズとして使用
+            query = normalize_text(query, strip=False)
+            return ([query] if query.strip() else []), "AND"
+        # NEAR 演算子を大文字小文字で見分けられるよう、casefoldは分解した語ごとにかける
+        query = normalize_text(query, casefold=False)
+        if " OR " in query.upper():
+            keywords = []
+            for part in re.split(r" OR ", query, flags=re.IGNORECASE):
+                clauses = PDFSearchSystem._parse_clauses(part)
+                if len(clauses) == 1:
+                    keywords.append(clauses[0])
+                elif part.replace('"', '').strip():
+                    # ORで区切った部分は、以前と同じくスペースを含む1つのフレーズとして扱う
+                    keywords.append(part.replace('"', '').strip().casefold())
+            return keywords, "OR"
+        return PDFSearchSystem._parse_clauses(query), "AND"
+
+    @staticmethod
+    def _parse_clauses(text: str) -> List:
+        """スペース区切りの語・"..."のフレーズ・NEAR/nで結んだ語を、キーワードのリストに分解
+
+        語の前後どちらかが無い NEAR（先頭・末尾・連続したもの）は演算子ではなく、ふつうの語として扱う。
+        A NEAR/m B NEAR/n C は隣り合う語の組ごとの条件（A と B が m 文字以内、かつ B と C が n 文字以内）にする
+        """
+        clauses = []
+        near_distance = None
+        near_term = None
+        for match in re.finditer(r'"([^"]*)"|(\S+)', text):
+            quoted = match.group(1) is not None
+            term = (match.group(1) if quoted else match.group(2)).strip()
+            near = None if quoted else _NEAR_OPERATOR.fullmatch(term)
+            if near and clauses and near_distance is None:
+                near_distance = int(near.group(1) or DEFAULT_NEAR_DISTANCE)
+                near_term = term
+                continue
+            term = term.casefold()
+            if not term:
+                continue
+            if near_distance is not None:
+                # 直前の語と、この語を近接検索の条件にまとめる（直前が近接検索の条件なら、その最後の語と組にする）
+                previous = clauses[-1]
+                if isinstance(previous, ProximityQuery):
+                    term = ProximityQuery((previous.terms[-1], term), near_distance)
+                else:
+                    clauses.pop()
+                    term = ProximityQuery((previous, term), near_distance)
+                near_distance = None
+            clauses.append(term)
+        if near_distance is not None:
+            # 末尾の NEAR は結ぶ語が無いので、検索する語として残す
+            clauses.append(near_term.casefold())
+        return clauses
+
+    @staticmethod
+    def _flatten_terms(keywords: List) -> List[str]:
+        """近接検索の条件を展開し、強調表示やファイル名の加点に使う語のリストにする"""
+        terms = []
+        for keyword in keywords:
+            terms.extend(keyword.terms if isinstance(keyword, ProximityQuery) else [keyword])
+        # A NEAR B NEAR C の B のように、複数の条件に含まれる語は1回だけにする
+        return list(dict.fromkeys(terms))
+
+    @staticmethod
+    def _uses_fts(keyword, use_fts: bool) -> bool:
+        """キーワードを全文検索インデックスだけで検索できるか（trigramは3文字未満の語を検索できない）"""
+        if not use_fts:
+            return False
+        if isinstance(keyword, ProximityQuery):
+            return all(len(term) >= FTS_MIN_TERM_LENGTH for term in keyword.terms)
+        return len(keyword) >= FTS_MIN_TERM_LENGTH
+
+    def _fts_expression(self, keyword) -> str:
+        """キーワードをFTS5のMATCH式に変換
+
+        近接検索はFTS5のNEARで、インデックスに記録された位置から判定する。trigramでは1文字ごとに
+        位置が進むため、語と語の間の文字数がnのときのNEARの距離はn+2になる
+        """
+        if isinstance(keyword, ProximityQuery):
+            phrases = " ".join(self._fts_phrase(term) for term in keyword.terms)
+            return f"NEAR({phrases}, {keyword.distance + 2})"
+        return self._fts_phrase(keyword)
+
+    @staticmethod
+    def _proximity_regex(keyword: ProximityQuery) -> str:
+        """近接検索の条件を、ページの本文を確認するための正規表現にする（順序は問わない）"""
+        gap = f".{{0,{keyword.distance}}}"
+        return "|".join(gap.join(re.escape(term) for term in order)
+                        for order in itertools.permutations(keyword.terms))
+
+    def _page_condition(self, keyword):
+        """ページの本文がキーワードを含むかを判定するSQLの式とパラメータ"""
+        if isinstance(keyword, ProximityQuery):
+            return "content REGEXP ?", [self._proximity_regex(keyword)]
+        return "instr(content, ?) > 0", [keyword]
+
+    def _build_keyword_condition(self, keywords: List[str], operator: str, use_fts: bool):
+        """キーワードから文書を絞り込むWHERE句とパラメータを組み立てる
+
+        AND検索では語ごとに別のページにあっても一致とするため、語ごとに文書IDで絞り込む。
+        trigramトークナイザーは3文字未満の語を検索できないため、短い語はLIKEで絞り込む。
+        3文字未満の語を含む近接検索は、ほかの語で全文検索インデックスから絞り込んだページを正規表現で確認する
+        """
+        conditions = []
+        params = []
+        fts_terms = [k for k in keywords if self._uses_fts(k, use_fts)]
+        if operator == "OR" and fts_terms:
+            # OR検索はページ単位で一致すればよいので1つのMATCH式にまとめる
+            fts_groups = [fts_terms]
         else:
-            if " OR " in query.upper():
-                keywords = [k.strip() for k in query.split(" OR ")]
+            fts_groups = [[k] for k in fts_terms]
+        for group in fts_groups:
+            conditions.append("id IN (SELECT doc_id FROM pdf_pages WHERE id IN "
+                              "(SELECT rowid FROM pdf_pages_fts WHERE pdf_pages_fts MATCH ?))")
+            params.append(" OR ".join(self._fts_expression(k) for k in group))
+        for keyword in keywords:
+            if keyword in fts_terms:
+                continue
+            if isinstance(keyword, ProximityQuery):
+                long_terms = [t for t in keyword.terms if use_fts and len(t) >= FTS_MIN_TERM_LENGTH]
+                page_filter = ""
+                if long_terms:
+                    page_filter = "id IN (SELECT rowid FROM pdf_pages_fts WHERE pdf_pages_fts MATCH ?) AND "
+                    params.append(" AND ".join(self._fts_phrase(t) for t in long_terms))
+                conditions.append(f"id IN (SELECT doc_id FROM pdf_pages WHERE {page_filter}content REGEXP ?)")
+                params.append(self._proximity_regex(keyword))
             else:
-                keywords = query.split()
-            
-            contexts = []
-            for keyword in keywords:
-                match = re.search(f".{{0,100}}{re.escape(keyword)}.{{0,100}}", content)
-                if match:
-                    contexts.append(match.group(0))
-            
-            return "\n...\n".join(contexts) if contexts else content[:200]
-        
-        return content[:200]
-    
-    def should_exclude_file(self, file_path: Path) -> bool:
-        """ファイルを検索対象から除外すべきかを判定"""
-        filename = file_path.stem.lower()
-        return any(pattern.lower() in filename for pattern in self.exclude_patterns)
+                conditions.append("id IN (SELECT doc_id FROM pdf_pages WHERE content LIKE ?)")
+                params.append(f"%{keyword}%")
+        return "(" + f" {operator} ".join(conditions) + ")", params
+
+    def _build_pattern_condition(self, regex: str, literals: List[str], use_fts: bool):
+        """パターン検索で文書を絞り込むWHERE句とパラメータを組み立てる
+
+        正規表現が必ず含む3文字以上の文字列で全文検索インデックスからページを絞り込み、
+        残ったページだけをREGEXP（Pythonの正規表現）で確認する。
+        固定の文字列を含まないパターンでは、すべてのページを正規表現で確認することになる
+        """
+        fts_terms = [k for k in literals if use_fts and len(k) >= FTS_MIN_TERM_LENGTH]
+        page_filter = ""
+        params = []
+        if fts_terms:
+            # 1つのページに一致する必要があるので、ページ単位のANDで絞り込む
+            page_filter = "id IN (SELECT rowid FROM pdf_pages_fts WHERE pdf_pages_fts MATCH ?) AND "
+            params.append(" AND ".join(self._fts_phrase(k) for k in fts_terms))
+        params.append(regex)
+        return f"id IN (SELECT doc_id FROM pdf_pages WHERE {page_filter}content REGEXP ?)", params
+
+    def _build_rank_query(self, keywords: List[str], use_fts: bool):
+        """関連度の高い順に並べるための (WITH句, スコアの式, 結合する句, それぞれのパラメータ) を組み立てる
+
+        関連度はFTS5のBM25で求め、文書内で最もよく一致したページの値を文書の値とする。
+        BM25の値の大きさは文書数や語の出現頻度で大きく変わるため、一致した文書の中の最大値で割って0～1にそろえる。
+        3文字未満の語だけで一致した文書（BM25なし）の関連度は0とする。
+        スコア = (1 + 関連度) × (1 + ファイル名の加点 × ファイル名に含む語の数)
+                 × (1 + 新しさの加点 / (1 + 経過日数 / 半減日数))
+        """
+        fts_terms = [k for k in keywords if self._uses_fts(k, use_fts)]
+        name_terms = [k.strip() for k in self._flatten_terms(keywords) if k.strip()]
+
+        with_clause = ""
+        with_params = []
+        join = ""
+        relevance = "0"
+        if fts_terms:
+            # rank列（既定ではbm25()の値）は一致度が高いほど小さい（負の）値になるため、符号を反転する
+            # （最大値をウィンドウ関数で求めると結合に自動インデックスが使われず遅くなるため、WITH句にする）
+            with_clause = """
+                WITH ranked AS (
+                    SELECT pdf_pages.doc_id AS doc_id, -MIN(hits.rank) AS relevance
+                    FROM (
+                        SELECT rowid, rank FROM pdf_pages_fts WHERE pdf_pages_fts MATCH ?
+                    ) AS hits JOIN pdf_pages ON pdf_pages.id = hits.rowid
+                    GROUP BY pdf_pages.doc_id
+                )
+            """
+            with_params.append(" OR ".join(self._fts_expression(k) for k in fts_terms))
+            join = "LEFT JOIN ranked ON ranked.doc_id = pdf_contents.id"
+            relevance = "COALESCE(ranked.relevance / (SELECT MAX(relevance) FROM ranked), 0)"
+
+        name_hits = " + ".join("(instr(file_stem, ?) > 0)" for _ in name_terms) or "0"
+        score = (f"(1 + {relevance}) * (1 + ? * ({name_hits}))"
+                 f" * (1 + ? / (1 + max(? - last_modified, 0) / 86400.0 / ?))")
+        score_params = ([self.rank_filename_boost] + name_terms +
+                        [self.rank_recency_boost, time.time(), self.rank_recency_half_life_days])
+        return with_clause, with_params, score, score_params, join
+
+    @staticmethod
+    def _build_refine_rank_query(candidates: List[tuple]):
+        """前の検索結果から絞り込む場合の並べ替え（_build_rank_queryと同じ形式で返す）
+
+        BM25は全文検索インデックス全体で一致を数え直すため、前の結果に限っても全体を走査するのと変わらない。
+        そのため前の結果のスコアをそのまま使う（入力中に語を延ばしても、結果の並びは入れ替わらない）
+        """
+        values = ", ".join(f"({int(doc_id)}, {float(score)!r})" for doc_id, score in candidates)
+        return (f"WITH previous (doc_id, score) AS (VALUES {values})", [], "previous.score", [],
+                "JOIN previous ON previous.doc_id = pdf_contents.id")
+
+    @staticmethod
+    def _folder_condition(folder: str, include_subfolders: bool):
+        """フォルダー（とサブフォルダー）のファイルだけに絞り込む式とパラメータ"""
+        base_dir, _ = normalize_path_columns(os.path.join(folder, "_"))
+        if include_subfolders:
+            # "base/" 以上 "base0" 未満（'0'は'/'の次の文字）の範囲で、インデックスを使ってサブフォルダーを絞り込む
+            prefix = base_dir if base_dir.endswith("/") else base_dir + "/"
+            return "(dir_path = ? OR (dir_path >= ? AND dir_path < ?))", [base_dir, prefix, prefix[:-1] + "0"]
+        return "dir_path = ?", [base_dir]
+
+    def _build_path_condition(self, include_subfolders: bool):
+        """検索フォルダー（とサブフォルダー）と除外パターンで絞り込むWHERE句とパラメータを組み立てる"""
+        condition, params = self._folder_condition(self.folder_path, include_subfolders)
+        conditions = [condition]
+
+        for pattern in self.exclude_patterns or []:
+            if pattern:
+                conditions.append("instr(file_stem, ?) = 0")
+                params.append(normalize_text(pattern))
+        return " AND ".join(conditions), params
+
+    def _build_filter_condition(self, filters: Dict):
+        """文書情報の絞り込み条件（normalize_search_filtersで変換済み）からWHERE句とパラメータを組み立てる
 
-    def search(self, query: str, exact_match: bool = False, include_subfolders: bool = False) -> List[Dict]:
+        作成者・タイトル以外の列にはインデックスがあるため、本文の検索より先に候補を絞り込める
+        """
+        conditions = []
+        params = []
+        for key, column, operator in (("modified_after", "last_modified", ">="),
+                                      ("modified_before", "last_modified", "<"),
+                                      ("created_after", "created", ">="),
+                                      ("created_before", "created", "<"),
+                                      ("min_pages", "page_count", ">="),
+                                      ("max_pages", "page_count", "<="),
+                                      ("min_size", "file_size", ">="),
+                                      ("max_size", "file_size", "<=")):
+            if key in filters:
+                conditions.append(f"{column} {operator} ?")
+                params.append(filters[key])
+        for key in ("author", "title"):
+            if key in filters:
+                # 部分一致なのでインデックスは使えないが、ほかの条件で絞り込んだ行だけを調べる
+                conditions.append(f"instr({key}_key, ?) > 0")
+                params.append(filters[key])
+        if "folder" in filters:
+            folder = os.path.join(self.folder_path, filters["folder"])  # 絶対パスならそのまま
+            condition, folder_params = self._folder_condition(folder, True)
+            conditions.append(condition)
+            params.extend(folder_params)
+        return " AND ".join(conditions) or "1", params
+
+    def _get_matching_pages(self, cursor, doc_id: int, keywords: List) -> List[int]:
+        """文書のうち、キーワードを含むページの番号を取得（近接検索は1つの文書の中だけを正規表現で確認する）"""
+        conditions = []
+        params = [doc_id]
+        for keyword in keywords:
+            condition, condition_params = self._page_condition(keyword)
+            conditions.append(condition)
+            params.extend(condition_params)
+        cursor.execute(f"""
+            SELECT page_no
+            FROM pdf_pages
+            WHERE doc_id = ? AND ({" OR ".join(conditions)})
+            ORDER BY page_no
+        """, params)
+        return [page_no for page_no, in cursor.fetchall()]
+
+    def _get_regex_pages(self, cursor, doc_id: int, regex: str) -> List[int]:
+        """文書のうち、パターンに一致するページの番号を取得"""
+        cursor.execute("""
+            SELECT page_no
+            FROM pdf_pages
+            WHERE doc_id = ? AND content REGEXP ?
+            ORDER BY page_no
+        """, (doc_id, regex))
+        return [page_no for page_no, in cursor.fetchall()]
+
+    def _get_regex_snippets(self, cursor, doc_id: int, page_no: Optional[int], engine: SnippetEngine):
+        """パターンに一致した最初のページから、一致した位置の前後を切り出す"""
+        if page_no is None:
+            cursor.execute("SELECT content FROM pdf_pages WHERE doc_id = ? ORDER BY page_no LIMIT 1", (doc_id,))
+        else:
+            cursor.execute("SELECT content FROM pdf_pages WHERE doc_id = ? AND page_no = ?", (doc_id, page_no))
+        row = cursor.fetchone()
+        return engine.extract(row[0] or "") if row else ("", [])
+
+    def _get_snippets(self, cursor, doc_id: int, keywords: List[str], engine: SnippetEngine):
+        """キーワードの前後をSQLite内で切り出し、(コンテキスト, 強調表示する位置) を返す
+
+        ページ全体はPythonに読み込まず、切り出した範囲だけをSnippetEngineでまとめる
+        """
+        fragments = []
+        for keyword in self._flatten_terms(keywords):
+            cursor.execute("""
+                SELECT page_no, max(pos - ?, 1),
+                       substr(content, max(pos - ?, 1), pos - max(pos - ?, 1) + ? + ?)
+                FROM (
+                    SELECT page_no, content, instr(content, ?) AS pos
+                    FROM pdf_pages
+                    WHERE doc_id = ?
+                )
+                WHERE pos > 0
+                ORDER BY page_no
+                LIMIT 1
+            """, (engine.window, engine.window, engine.window, len(keyword), engine.window, keyword, doc_id))
+            row = cursor.fetchone()
+            if row:
+                fragments.append(row)
+        if fragments:
+            return engine.build(fragments)
+
+        # キーワードの位置が見つからない場合は先頭部分を表示
+        cursor.execute("""
+            SELECT substr(content, 1, ?) FROM pdf_pages WHERE doc_id = ? ORDER BY page_no LIMIT 1
+        """, (engine.window * 2, doc_id))
+        row = cursor.fetchone()
+        return (row[0] if row else ""), []
+
+    def search(self, query: str, exact_match: bool = False, include_subfolders: bool = False,
+               limit: Optional[int] = None, details: bool = True, pattern_mode: str = "",
+               filters: Optional[Dict] = None) -> List[Dict]:
         """PDFの検索を実行"""
-        # キャッシュキーの生成
-        cache_key = f"{query}_{exact_match}_{include_subfolders}"
-        
-        # 有効なキャッシュがあれば使用
-        cached_result = self._query_cache.get(cache_key)
-        if cached_result and time.time() - cached_result['time'] < self._cache_timeout:
-            return cached_result['results']
+        return list(self.iter_search(query, exact_match, include_subfolders, limit,
+                                     details=details, pattern_mode=pattern_mode, filters=filters))
+
+    def _get_refine_candidates(self, previous_query: str, keywords: List[str], operator: str,
+                               include_subfolders: bool, generation: int, limit: int,
+                               details: bool, filters: Dict) -> Optional[List[tuple]]:
+        """前の検索結果から絞り込める場合は、その (文書ID, スコア) のリストを返す（絞り込めない場合はNone）
+
+        前の検索語がすべて新しいAND検索の語のどれかに含まれていれば、新しい検索の結果は前の結果に含まれる。
+        前の結果がキャッシュに無い（インデックスが更新された）場合や、件数の上限で切り捨てられていた場合は使わない。
+        """
+        if operator != "AND" or not all(isinstance(k, str) for k in keywords):
+            return None
+        previous_keywords, previous_operator = self._parse_query(previous_query, False)
+        if previous_operator != "AND" or not previous_keywords:
+            return None
+        if not all(isinstance(p, str) for p in previous_keywords):
+            return None
+        if not all(any(p in k for k in keywords) for p in previous_keywords):
+            return None
+        previous_results = self.query_cache.get(
+            QueryCache.make_key(previous_query, False, include_subfolders, generation, limit, details,
+                                filters=filters))
+        if previous_results is None or len(previous_results) >= limit:
+            return None
+        return [(result["doc_id"], result["score"]) for result in previous_results]
+
+    def iter_search(self, query: str, exact_match: bool = False, include_subfolders: bool = False,
+                    limit: Optional[int] = None, cancel_event: Optional[threading.Event] = None,
+                    refine_from: Optional[str] = None, details: bool = True, pattern_mode: str = "", 
+                    filters: Optional[Dict] = None):
+        """PDFの検索を実行し、関連度の高い順に上位limit件（省略時は設定の件数）を1件ずつ返す
 
-        conn = sqlite3.connect(str(self.db_path))
+        pattern_modeに "regex" か "wildcard" を指定すると、検索語をパターンとして扱う
+        （正しくないパターンの場合はValueError）。この場合exact_matchとrefine_fromは使わない。
+        detailsがFalseの場合は該当ページとコンテキストを作らず、ファイルの情報だけを返す
+        （画面では選択した結果の分だけget_document_snippetsで後から取得する）。
+        cancel_eventがセットされると、実行中のSQLも含めて検索を中断する（結果はキャッシュしない）。
+        refine_fromに直前の検索語を渡すと、可能であれば前の結果の中だけを検索する（入力中の検索用）。
+        filtersには更新日・作成日・ページ数・サイズ・フォルダー・作成者・タイトルの条件（SEARCH_FILTERS）を指定でき、
+        本文を調べる前に文書情報のインデックスで候補を絞り込む（正しくない条件の場合はValueError）。
+        """
+        limit = limit or self.result_limit
+        filters = normalize_search_filters(filters)
+        if pattern_mode:
+            query = build_search_regex(query, pattern_mode)
+            exact_match = False
+        if not self.db_path.exists():
+            # インデックスDBがまだ作成されていない
+            return
+
+        conn = self.read_pool.acquire()
         cursor = conn.cursor()
+        detail_cursor = conn.cursor()
+        if cancel_event is not None:
+            # SQLiteの処理中も定期的に呼ばれ、0以外を返すとSQLが中断される
+            conn.set_progress_handler(lambda: 1 if cancel_event.is_set() else 0, 1000)
         
         try:
-            # SQLクエリの作成
-            if exact_match:
-                # 1語の場合は前後にスペースが追加済みのqueryをそのまま使用
-                sql = """
-                    SELECT file_path, content, last_modified 
-                    FROM pdf_contents 
-                    WHERE content LIKE ?
-                """
-                params = [f"%{query}%"]
+            # キャッシュキーの生成（インデックスが更新されると世代番号が変わる）
+            generation = self._get_index_generation(cursor)
+            cache_key = QueryCache.make_key(query, exact_match, include_subfolders, generation, limit,
+                                            details, pattern_mode, filters)
+
+            # 有効なキャッシュがあれば使用
+            cached_results = self.query_cache.get(cache_key)
+            if cached_results is not None:
+                yield from cached_results
+                return
+
+            if not self._table_exists(cursor, "pdf_pages"):
+                # ページ単位のインデックスへの移行前
+                return
+            use_fts = self._table_exists(cursor, "pdf_pages_fts")
+
+            if pattern_mode:
+                # 正規表現が必ず含む文字列で絞り込んだページだけを正規表現で確認する
+                keywords = required_literals(query)
+                where, params = self._build_pattern_condition(query, keywords, use_fts)
+                operator = "AND"
+                engine = SnippetEngine.from_regex(query)
+                refine_from = None
             else:
-                if " OR " in query.upper():
-                    keywords = [k.strip() for k in query.split(" OR ")]
-                    query_parts = " OR ".join([f"content LIKE ?" for _ in keywords])
-                    params = [f"%{k}%" for k in keywords]
-                else:
-                    keywords = query.split()
-                    query_parts = " AND ".join([f"content LIKE ?" for _ in keywords])
-                    params = [f"%{k}%" for k in keywords]
-                
-                sql = f"""
-                    SELECT file_path, content, last_modified 
-                    FROM pdf_contents 
-                    WHERE {query_parts}
-                """
-
-            # サブフォルダー設定に基づいてパスのフィルタリング
-            if not include_subfolders:
-                # サブフォルダーを含まない場合、ベースフォルダー直下のファイルのみを対象とする
-                sql += " AND file_path NOT LIKE ?"
-                base_path_str = str(Path(self.folder_path)).replace('\\', '\\\\') + "\\\\%\\\\"
-                params.append(base_path_str)
-
-            sql += " LIMIT 1000"
+                # SQLクエリの作成（本文と同じ正規化をかけ、全角・半角や大文字小文字の違いを吸収してFTS5のMATCH式に変換）
+                keywords, operator = self._parse_query(query, exact_match)
+                if not keywords:
+                    return
+                # キーワードは検索ごとに1回だけコンパイルする
+                engine = SnippetEngine(self._flatten_terms(keywords))
+            candidates = None
+            if refine_from and not exact_match:
+                candidates = self._get_refine_candidates(refine_from, keywords, operator,
+                                                         include_subfolders, generation, limit, details,
+                                                         filters)
+            if candidates is not None:
+                if not candidates:
+                    self.query_cache.put(cache_key, [])
+                    return
+                # 前の結果の文書だけを、ページの本文を直接調べて絞り込む（インデックス全体は走査しない）
+                where = " AND ".join("EXISTS (SELECT 1 FROM pdf_pages WHERE doc_id = pdf_contents.id"
+                                     " AND instr(content, ?) > 0)" for _ in keywords)
+                params = list(keywords)
+                rank_query = self._build_refine_rank_query(candidates)
+            else:
+                if not pattern_mode:
+                    where, params = self._build_keyword_condition(keywords, operator, use_fts)
+                rank_query = self._build_rank_query(keywords, use_fts)
+
+            # サブフォルダー設定と除外パターンもSQLで絞り込み、LIMITには実際の結果だけが数えられるようにする
+            path_where, path_params = self._build_path_condition(include_subfolders)
+            filter_where, filter_params = self._build_filter_condition(filters)
+            with_clause, with_params, score, score_params, join = rank_query
+
+            # ORDER BYとLIMITを合わせて指定すると、SQLiteは上位limit件だけを保持して並べ替えるため、
+            # 一致する文書が多くても全件を並べ替えることはない。コンテキストは上位の文書についてだけ作る
+            sql = f"""
+                {with_clause}
+                SELECT id, file_path, last_modified, {", ".join(DOCUMENT_INFO_COLUMNS)}, {score} AS score
+                FROM pdf_contents {join}
+                WHERE {filter_where} AND {path_where} AND {where}
+                ORDER BY score DESC
+                LIMIT ?
+            """
+            params = with_params + score_params + filter_params + path_params + params + [limit]
             
+            # fetchallせずに1行ずつ処理し、見つかった結果からすぐに返す
             cursor.execute(sql, params)
             results = []
-            for file_path, content, last_modified in cursor.fetchall():
-                # ファイルパスのチェック（サブフォルダー設定とファイル名除外パターンに基づく）
-                path_obj = Path(file_path)
-                if (include_subfolders or path_obj.parent == Path(self.folder_path)) and \
-                   not self.should_exclude_file(path_obj):  # 除外パターンのチェックを追加
-                    context = self._extract_context(content, query, exact_match)
-                    results.append({
-                        "file_path": file_path,
-                        "file_name": path_obj.name,
-                        "context": context,
-                        "last_modified": time.strftime('%Y-%m-%d %H:%M:%S', 
-                                                     time.localtime(last_modified))
-                    })
+            for row in cursor:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                doc_id, file_path, last_modified = row[:3]
+                info = dict(zip(DOCUMENT_INFO_COLUMNS, row[3:-1]))
+                score = row[-1]
+                if details:
+                    result = self._build_result(detail_cursor, doc_id, file_path, last_modified, keywords, engine,
+                                                info)
+                else:
+                    result = self._build_file_info(doc_id, file_path, last_modified, info)
+                result["score"] = round(score, 4)
+                results.append(result)
+                yield result
             # 結果をキャッシュ
-            self._query_cache[cache_key] = {
-                'time': time.time(),
-                'results': results
-            }
-            return results
-            
+            self.query_cache.put(cache_key, results)
+
+        except sqlite3.OperationalError:
+            if cancel_event is not None and cancel_event.is_set():
+                return  # progress handlerによる中断
+            raise
         finally:
-            conn.close()
+            if cancel_event is not None:
+                conn.set_progress_handler(None, 0)
+            cursor.close()
+            detail_cursor.close()
+            self.read_pool.release(conn)
 
-def import_pdf_module(search_system):
-    """PDFモジュールのインポートとインデックス作成を別スレッドで実行"""
-    try:
-        import pdfplumber
-        from pypdf import PdfReader
+    @staticmethod
+    def _build_file_info(doc_id: int, file_path: str, last_modified: float,
+                         info: Optional[Dict] = None) -> Dict:
+        """1ファイル分の検索結果のうち、ファイルの情報（と文書情報）だけを作成"""
+        result = {
+            "doc_id": doc_id,
+            "file_path": file_path,
+            "file_name": Path(file_path).name,
+            "last_modified": time.strftime('%Y-%m-%d %H:%M:%S', 
+                                         time.localtime(last_modified))
+        }
+        if info:
+            result.update(info)
+            if info.get("created") is not None:
+                result["created"] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info["created"]))
+        return result
 
-        def extract_text_from_pdf(pdf_path: Path) -> str:
-            """複数の方法を組み合わせてPDFからテキストを抽出"""
-            content = ""
-            
-            try:
-                with pdfplumber.open(pdf_path) as pdf:
-                    for page in pdf.pages:
-                        text = page.extract_text(layout=True)
-                        if text:
-                            content += text + "\n"
-                        
-                        tables = page.extract_tables()
-                        for table in tables:
-                            for row in table:
-                                content += " ".join([str(cell) for cell in row if cell]) + "\n"
-                            
-            except Exception as e:
-                print(f"pdfplumber failed for {pdf_path}: {e}")
-                
-                try:
-                    reader = PdfReader(pdf_path)
-                    for page in reader.pages:
-                        text = page.extract_text()
-                        if text:
-                            content += text + "\n"
-                except Exception as e:
-                    print(f"PyPDF also failed for {pdf_path}: {e}")
-                    return ""
+    def _build_result(self, cursor, doc_id: int, file_path: str, last_modified: float,
+                      keywords: List[str], engine: SnippetEngine, info: Optional[Dict] = None) -> Dict:
+        """1ファイル分の検索結果（該当ページとキーワード前後のテキスト）を作成"""
+        if engine.regex:
+            page_nos = self._get_regex_pages(cursor, doc_id, engine.regex)
+            context, highlights = self._get_regex_snippets(cursor, doc_id, page_nos[0] if page_nos else None, engine)
+        else:
+            page_nos = self._get_matching_pages(cursor, doc_id, keywords)
+            context, highlights = self._get_snippets(cursor, doc_id, keywords, engine)
+        result = self._build_file_info(doc_id, file_path, last_modified, info)
+        result.update({
+            "pages": [page_no for page_no in page_nos if page_no > 0],
+            "context": context,
+            "highlights": highlights  # context内のキーワードの位置 (開始, 終了)
+        })
+        return result
 
-            return search_system._normalize_text(content)
+    def get_document_snippets(self, file_path: str, query: str, exact_match: bool = False,
+                              pattern_mode: str = "") -> Optional[Dict]:
+        """指定したファイルだけについて、検索結果と同じ形式で該当ページとコンテキストを返す"""
+        if not self.db_path.exists():
+            return None
 
-        def should_exclude_file(file_path: Path) -> bool:
-            """ファイルを検索対象から除外すべきかを判定"""
-            return search_system.should_exclude_file(file_path)  # クラスのメソッドを使用
+        conn = self.read_pool.acquire()
+        cursor = conn.cursor()
+        try:
+            if not self._table_exists(cursor, "pdf_pages"):
+                return None
+            if pattern_mode:
+                regex = build_search_regex(query, pattern_mode)
+                keywords = required_literals(regex)
+                engine = SnippetEngine.from_regex(regex)
+            else:
+                keywords, _ = self._parse_query(query, exact_match)
+                if not keywords:
+                    return None
+                engine = SnippetEngine(self._flatten_terms(keywords))
+            cursor.execute(f"SELECT id, last_modified, {', '.join(DOCUMENT_INFO_COLUMNS)} "
+                           "FROM pdf_contents WHERE file_path = ?", (file_path,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            doc_id, last_modified = row[:2]
+            info = dict(zip(DOCUMENT_INFO_COLUMNS, row[2:]))
+            return self._build_result(cursor, doc_id, file_path, last_modified, keywords, engine, info)
+        finally:
+            cursor.close()
+            self.read_pool.release(conn)
 
-        def setup_database():
-            """データベースとテーブルの初期設定"""
-            os.makedirs(os.path.dirname(search_system.db_path), exist_ok=True)
-            conn = sqlite3.connect(str(search_system.db_path))
-            cursor = conn.cursor()
-            
+    def get_status(self) -> Dict:
+        """インデックス作成の進捗と検索キャッシュの状態を返す"""
+        generation = 0
+        if self.db_path.exists():
+            conn = self.read_pool.acquire()
             try:
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS pdf_contents (
-                        id INTEGER PRIMARY KEY,
-                        file_path TEXT UNIQUE,
-                        content TEXT,
-                        last_modified REAL,
-                        created_at REAL,
-                        updated_at REAL
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_content 
-                    ON pdf_contents(content)
-                ''')
-                
-                conn.commit()
+                generation = self._get_index_generation(conn.cursor())
             finally:
-                conn.close()
-        def index_pdfs():
-            """PDFファイルのインデックス作成（差分更新）"""
-            conn = sqlite3.connect(str(search_system.db_path))
-            cursor = conn.cursor()
-            
+                self.read_pool.release(conn)
+        return {
+            "complete": self.indexing_complete.is_set(),
+            "progress": dict(self.indexing_progress),
+            "include_subfolders_index": bool(self.include_subfolders_index),
+            "generation": generation,
+            "query_cache": self.query_cache.stats()
+        }
+
+    def get_slowest_files(self, limit: int = 20) -> List[Dict]:
+        """テキスト抽出に時間がかかったファイルを、時間の長い順に返す（除外や抽出方式の見直し用）"""
+        if not self.db_path.exists():
+            return []
+
+        conn = self.read_pool.acquire()
+        cursor = conn.cursor()
+        try:
             try:
-                # PDFファイルのリストアップ
-                if search_system.include_subfolders_index:
-                    pdf_files = list(Path(search_system.folder_path).glob("**/*.pdf"))
-                else:
-                    pdf_files = list(Path(search_system.folder_path).glob("*.pdf"))
-                
-                # インデックス作成開始を表示
-                search_system.indexing_progress["status"] = "インデックスをサーチ中。既存のインデックス分は検索できます。..."
-                search_system.indexing_progress["total"] = len(pdf_files)
-                search_system.indexing_progress["current"] = 0
-                
-                # トランザクションを開始
-                with conn:
-                    for pdf_path in pdf_files:
-                        search_system.indexing_progress["current"] += 1
-                        
-                        if should_exclude_file(pdf_path):
-                            continue
-
-                        last_modified = os.path.getmtime(pdf_path)
-                        
-                        cursor.execute(
-                            "SELECT last_modified FROM pdf_contents WHERE file_path = ?", 
-                            (str(pdf_path),)
-                        )
-                        result = cursor.fetchone()
-                        
-                        if not result or result[0] < last_modified:
-                            try:
-                                content = extract_text_from_pdf(pdf_path)
-                                if not content:
-                                    continue
-                                    
-                                current_time = time.time()
-                                if result:
-                                    cursor.execute('''
-                                        UPDATE pdf_contents 
-                                        SET content = ?, last_modified = ?, updated_at = ?
-                                        WHERE file_path = ?
-                                    ''', (content, last_modified, current_time, str(pdf_path)))
-                                else:
-                                    cursor.execute('''
-                                        INSERT INTO pdf_contents 
-                                        (file_path, content, last_modified, created_at, updated_at)
-                                        VALUES (?, ?, ?, ?, ?)
-                                    ''', (str(pdf_path), content, last_modified, current_time, current_time))
-                            
-                            except Exception as e:
-                                print(f"Error processing {pdf_path}: {e}")
-            finally:
-                conn.close()
+                cursor.execute("""
+                    SELECT file_path, tier, extractor, fallback, pages, bytes_in, chars_out,
+                           wall_seconds, cpu_seconds, error, extracted_at, status, limit_reason
+                    FROM extraction_stats
+                    ORDER BY wall_seconds DESC
+                    LIMIT ?
+                """, (limit,))
+            except sqlite3.OperationalError:
+                return []  # extraction_statsテーブル（や列）が無い以前のDB
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.read_pool.release(conn)
 
-        # データベースのセットアップを実行
-        setup_database()
-        # インデックス作成を開始
-        index_pdfs()
-        
-    except Exception as e:
-        print(f"Error in background indexing: {e}")
-    finally:
-        search_system.indexing_complete.set()
+def iter_pdf_pages(pdf_path: Path, tier: str = "full", stats: Optional[Dict] = None):
+    """複数の方法を組み合わせて、PDFのページごとの正規化済みテキストを1ページずつ返す
 
-def main():
-    """メインアプリケーション"""
-    root = tk.Tk()
-    root.title("PDF検索システム")
-    root.geometry("1000x700")
+    tier="fast" はpypdfで本文のテキストだけを抽出し（失敗した場合は"full"と同じ方法を使う）、
+    tier="full" はpdfplumberでレイアウトと表のテキストも抽出する。
+    途中のページで失敗した場合は、残りのページをもう一方の方法で抽出する。
+    statsを渡すと、実際に使った抽出方法（extractor）・最初の方法が失敗したか（fallback）・
+    総ページ数（page_count）・文書情報（metadata）を記録する。
+    どの方法でも1ページも読めなかった場合は例外を送出する（登録せず、次回も再試行させるため）
+    """
+    import pdfplumber
+    from pypdf import PdfReader
+
+    if stats is None:
+        stats = {}
+    stats["extractor"] = None
+    stats["fallback"] = False
+
+    def read_with_pypdf(start: int = 0):
+        reader = PdfReader(pdf_path)
+        stats["page_count"] = len(reader.pages)
+        stats["extractor"] = "pypdf"
+        try:
+            stats["metadata"] = read_pdf_metadata(reader.metadata)
+        except Exception as e:
+            print(f"文書情報を読み込めません {pdf_path}: {e}")
+        for index in range(start, len(reader.pages)):
+            yield normalize_text(reader.pages[index].extract_text() or "")
+
+    done = 0  # 抽出済みのページ数
+    if tier == "fast":
+        try:
+            for text in read_with_pypdf():
+                done += 1
+                yield text
+            return
+        except Exception as e:
+            print(f"PyPDF failed for {pdf_path}: {e}")
+            stats["fallback"] = True
+
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            stats["page_count"] = len(pdf.pages)
+            stats["extractor"] = "pdfplumber"
+            if not stats.get("metadata"):
+                try:
+                    stats["metadata"] = read_pdf_metadata(pdf.metadata)
+                except Exception as e:
+                    print(f"文書情報を読み込めません {pdf_path}: {e}")
+            for page in pdf.pages[done:]:
+                # ページの内容はリストに集めて1回で連結し、ページごとに正規化する
+                parts = []
+                text = page.extract_text(layout=True)
+                if text:
+                    parts.append(text)
+                
+                tables = page.extract_tables()
+                for table in tables:
+                    for row in table:
+                        parts.append(" ".join([str(cell) for cell in row if cell]))
+                # 解析済みの文字・図形のキャッシュはページごとに解放する
+                release = getattr(page, "close", None) or getattr(page, "flush_cache", None)
+                if release:
+                    release()
+                done += 1
+                yield normalize_text("\n".join(parts))
+                    
+    except Exception as e:
+        print(f"pdfplumber failed for {pdf_path}: {e}")
+        stats["fallback"] = True
+        
+        try:
+            yield from read_with_pypdf(done)
+        except Exception as e:
+            print(f"PyPDF also failed for {pdf_path}: {e}")
+            if not done:
+                # どの方法でも1ページも読めなかったファイルは、抽出の失敗として次回も再試行させる
+                stats["extractor"] = None
+                raise RuntimeError(f"pdfplumberとpypdfのどちらでも読み込めません: {e}") from e
+
+def current_memory_mb() -> Optional[float]:
+    """このプロセスの現在のメモリ使用量（MB）。取得できない環境ではNone"""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize / (1024 * 1024)
+    return None
+
+# 抽出時間の上限を過ぎても1ページの抽出が終わらない場合に、ワーカープロセスごと止めるまでの猶予（秒）
+EXTRACT_TIMEOUT_GRACE_SECONDS = 30
+# 抽出中のワーカープロセスが終了してから、結果が届かないファイルをエラーとするまでの猶予（秒）
+WORKER_EXIT_GRACE_SECONDS = 5
+
+# プロセスプールのワーカーが抽出を始めたファイルを親プロセスに知らせるキュー（ワーカーの中でだけ設定する）
+_extraction_started = None
+
+def _init_extract_worker(start_notices):
+    """プロセスプールのワーカーの初期化: 抽出を始めたファイルとプロセスIDをstart_noticesに送るようにする"""
+    global _extraction_started
+    _extraction_started = start_notices
+
+def extract_pages_from_pdf(pdf_path: Path, tier: str = "full", stats: Optional[Dict] = None,
+                           limits: Optional[Dict] = None) -> List[str]:
+    """PDFからページごとのテキストを抽出（戻り値のリストの i 番目が i+1 ページ目）
+
+    limitsで1ファイルあたりの上限（max_seconds: 時間, max_pages: ページ数, max_memory_mb: メモリ使用量）
+    を指定すると、ページを1つ抽出するたびに確認し、超えた時点で抽出を打ち切る。
+    打ち切った場合、statsのstatusは途中までのテキストがあれば"partial"、無ければ"skipped"になり、
+    limit_reasonに理由を記録する（1ページの抽出中には打ち切れないため、終わらないページは
+    呼び出し側がワーカープロセスごと止める。iter_extracted_textsとextraction_timeout_resultを参照）
+    """
+    if stats is None:
+        stats = {}
+    limits = limits or {}
+    max_seconds = limits.get("max_seconds") or 0
+    max_pages = limits.get("max_pages") or 0
+    max_memory_mb = limits.get("max_memory_mb") or 0
+
+    stats["status"] = "complete"
+    stats["limit_reason"] = None
+    start_time = time.perf_counter()
+    pages = []
+    page_iter = iter_pdf_pages(pdf_path, tier, stats)
+    try:
+        for text in page_iter:
+            pages.append(text)
+            reason = None
+            if max_pages and len(pages) >= max_pages and (stats.get("page_count") or 0) > max_pages:
+                reason = f"ページ数が上限（{max_pages}ページ）を超えています（{stats['page_count']}ページ）"
+            elif max_seconds and time.perf_counter() - start_time > max_seconds:
+                reason = f"抽出時間が上限（{max_seconds}秒）を超えました"
+            elif max_memory_mb:
+                memory_mb = current_memory_mb()
+                if memory_mb is not None and memory_mb > max_memory_mb:
+                    reason = f"メモリ使用量が上限（{max_memory_mb}MB）を超えました"
+            if reason:
+                stats["status"] = "partial" if any(pages) else "skipped"
+                stats["limit_reason"] = reason
+                print(f"{pdf_path}: {reason}（{len(pages)}ページ目まで登録）")
+                break
+    finally:
+        # 打ち切った場合もPDFファイルを閉じる
+        page_iter.close()
+    return pages
+
+def _extract_text_worker(task):
+    """ワーカープロセスでテキストを抽出（プロセスプールから呼び出される）
+
+    taskは (パス, 抽出方式, 上限の設定)。
+    (パス, ページのリスト, エラー, 抽出の統計) を返す。CPU時間はこのスレッドの分だけを測る
+    """
+    pdf_path, tier, limits = task
+    if _extraction_started is not None:
+        # ワーカーが異常終了したときに、親プロセスが抽出中だったファイルを見つけられるようにする
+        _extraction_started.put((pdf_path, os.getpid()))
+    stats = {"tier": tier}
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        pages, error = extract_pages_from_pdf(Path(pdf_path), tier, stats, limits), None
+    except Exception as e:
+        pages, error = [], str(e)
+    stats["wall_seconds"] = time.perf_counter() - start_wall
+    stats["cpu_seconds"] = time.thread_time() - start_cpu
+    stats["pages"] = len(pages)
+    stats["chars_out"] = sum(len(text) for text in pages)
+    try:
+        stats["bytes_in"] = os.path.getsize(pdf_path)
+    except OSError:
+        stats["bytes_in"] = None
+    return pdf_path, pages, error, stats
+
+def extraction_timeout_result(task, elapsed: float):
+    """抽出が終わらずにワーカープロセスごと止めたファイルの結果（登録を見送り、変更されるまで再抽出しない）"""
+    pdf_path, tier, limits = task
+    reason = f"抽出時間が上限（{limits.get('max_seconds')}秒）を超えても終わらないため中断しました"
+    print(f"{pdf_path}: {reason}")
+    stats = {"tier": tier, "status": "skipped", "limit_reason": reason, "wall_seconds": elapsed,
+             "cpu_seconds": None, "pages": 0, "chars_out": 0}
+    try:
+        stats["bytes_in"] = os.path.getsize(pdf_path)
+    except OSError:
+        stats["bytes_in"] = None
+    return pdf_path, [], None, stats
+
+def extraction_error_result(task, error: str):
+    """ワーカーから結果が返らなかったファイルの結果（エラーとして登録を見送り、次回も再試行する）"""
+    pdf_path, tier, limits = task
+    stats = {"tier": tier, "wall_seconds": None, "cpu_seconds": None, "pages": 0, "chars_out": 0}
+    try:
+        stats["bytes_in"] = os.path.getsize(pdf_path)
+    except OSError:
+        stats["bytes_in"] = None
+    return pdf_path, [], error, stats
+
+def parse_pdf_date(value: str) -> Optional[float]:
+    """PDFの日付（D:YYYYMMDDHHmmSS+09'00'）をUNIX時刻に変換（読めない場合はNone）"""
+    match = re.match(r"(?:D:)?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?\s*([Zz+\-])?(\d{2})?'?(\d{2})?",
+                     value.strip())
+    if not match:
+        return None
+    year, month, day, hour, minute, second, sign, tz_hour, tz_minute = match.groups()
+    try:
+        moment = datetime(int(year), int(month or 1), int(day or 1),
+                          int(hour or 0), int(minute or 0), int(second or 0))
+        if sign is None:
+            return time.mktime(moment.timetuple())  # 時差の指定が無い場合はこのPCの時刻とみなす
+        offset = timedelta(hours=int(tz_hour or 0), minutes=int(tz_minute or 0))
+        return moment.replace(tzinfo=timezone(-offset if sign == "-" else offset)).timestamp()
+    except (ValueError, OverflowError):
+        return None
+
+def read_pdf_metadata(info) -> Dict:
+    """PDFの文書情報（pypdfとpdfplumberのどちらの形式でもよい）から、タイトル・作成者・作成ソフト・作成日時を取り出す"""
+    metadata = {}
+    if not info:
+        return metadata
+    for key, name in (("Title", "title"), ("Author", "author"), ("Producer", "producer"),
+                      ("CreationDate", "created")):
+        value = info.get(key, info.get("/" + key))
+        if hasattr(value, "get_object"):
+            value = value.get_object()
+        if isinstance(value, bytes):
+            value = value.decode("utf-16" if value.startswith((b"\xfe\xff", b"\xff\xfe")) else "latin-1")
+        if value is None:
+            continue
+        value = str(value).replace("\x00", "").strip()
+        if not value:
+            continue
+        metadata[name] = parse_pdf_date(value) if name == "created" else value
+    return metadata
+
+def metadata_search_key(value: Optional[str]) -> Optional[str]:
+    """作成者・タイトルの絞り込み用に、本文と同じ正規化をかけた値（値が無ければNone）"""
+    return normalize_text(value) if value else None
+
+def format_duration(seconds: float) -> str:
+    """秒数を「1時間5分」「3分20秒」のような表示に変換"""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}時間{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+def format_progress(progress: Dict, suffix: str = "") -> str:
+    """インデックス作成の進捗を1行の文字列にする（処理速度と残り時間の見込みを含む）"""
+    total = progress.get("total") or 0
+    if total <= 0:
+        return progress.get("status", "")
+    text = f"{progress.get('status', '')}{suffix} ({progress.get('current', 0)}/{total})"
+    if progress.get("rate"):
+        text += f" {progress['rate']:.1f}件/秒"
+    if progress.get("eta_seconds") is not None:
+        text += f" 残り約{format_duration(progress['eta_seconds'])}"
+    return text
+
+def resolve_worker_count(setting) -> int:
+    """設定値からテキスト抽出に使うプロセス数を決定（0または未設定は自動）"""
+    try:
+        workers = int(setting or 0)
+    except (TypeError, ValueError):
+        workers = 0
+    if workers <= 0:
+        # GUIの操作用に1コア残す
+        workers = max(1, (os.cpu_count() or 1) - 1)
+    return workers
+
+def normalize_path_columns(file_path: str):
+    """ファイルパスから検索の絞り込みに使う (フォルダー, 正規化したファイル名) を求める
+
+    フォルダーは区切り文字を'/'にそろえ、Windowsでは大文字小文字も区別しない形にする
+    """
+    path = os.path.normcase(os.path.normpath(os.path.abspath(file_path)))
+    directory, file_name = os.path.split(path)
+    dir_path = directory.replace("\\", "/")
+    return dir_path, normalize_text(os.path.splitext(file_name)[0])
+
+def scan_pdf_files(folder: str, recursive: bool, failed_dirs: Optional[List[str]] = None):
+    """os.scandirでPDFファイルを順に列挙し、(パス, サイズ, 更新日時) を返す
+
+    scandirのエントリーが持つstat結果をそのまま使うので、ファイルごとに別途statしない。
+    読み込めなかったサブフォルダーはfailed_dirsに記録する（削除済みと誤判定しないため）。
+    """
+    root = str(Path(folder))
+    pending_dirs = [root]
+    while pending_dirs:
+        current = pending_dirs.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                pending_dirs.append(entry.path)
+                        elif entry.name.lower().endswith(".pdf") and entry.is_file():
+                            stat = entry.stat()
+                            yield entry.path, stat.st_size, stat.st_mtime
+                    except OSError as e:
+                        print(f"ファイル情報を取得できません: {entry.path}: {e}")
+        except OSError as e:
+            if current == root:
+                raise
+            print(f"フォルダーを読み込めません: {current}: {e}")
+            if failed_dirs is not None:
+                failed_dirs.append(current)
+
+# ネットワーク上のファイルシステム（inotifyでは他のPCからの変更を検知できない）
+NETWORK_FS_TYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "fuse.sshfs"}
+
+def is_network_path(path: str) -> bool:
+    """共有フォルダー（ネットワークマウント）上のパスかを判定"""
+    path = os.path.abspath(path)
+    if path.startswith("\\\\") or path.startswith("//"):
+        return True
+    if not sys.platform.startswith("linux"):
+        return False
+
+    # パスを含むマウントポイントのうち最も長いもののファイルシステム種別を調べる
+    mount_point, fs_type = "", ""
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace("\\040", " ")
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > len(mount_point):
+                    mount_point, fs_type = mount, fields[2]
+    except OSError:
+        return False
+    return fs_type in NETWORK_FS_TYPES
+
+class FolderWatcher:
+    """PDFフォルダーの変更を監視し、まとめて通知する
+
+    Linuxのローカルフォルダーではinotifyを使い、それ以外（共有フォルダーやWindowsなど）では
+    一定間隔でフォルダーを走査して (サイズ, 更新日時) の変化を検出する。
+    通知は debounce_seconds の間新しい変更が無くなった時点でまとめて on_changes に渡す。
+    """
+
+    # inotifyのイベント種別（linux/inotify.h）
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, folder: str, recursive: bool, on_changes, stop_event: threading.Event,
+                 debounce_seconds: float = 2.0, poll_interval: float = 60.0, mode: str = "auto"):
+        self.folder = str(Path(folder))
+        self.recursive = recursive
+        self.on_changes = on_changes  # on_changes(変更されたパスのリスト, フォルダー全体の再走査が必要か)
+        self.stop_event = stop_event
+        self.debounce_seconds = debounce_seconds
+        self.max_delay = max(debounce_seconds * 5, 10.0)  # 変更が続いても通知を遅らせる上限
+        self.poll_interval = poll_interval
+        self.mode = mode
+
+        self._pending = set()
+        self._rescan = False
+        self._first_event = 0.0
+        self._last_event = 0.0
+
+    def run(self):
+        """stop_eventがセットされるまで監視を続ける"""
+        use_inotify = self.mode == "inotify" or (
+            self.mode == "auto" and sys.platform.startswith("linux") and not is_network_path(self.folder))
+        if use_inotify:
+            try:
+                self._run_inotify()
+                return
+            except OSError as e:
+                print(f"inotifyを使用できないため定期的な走査で監視します: {e}")
+        self._run_polling()
+
+    def _add_change(self, path: Optional[str] = None, rescan: bool = False):
+        """変更を保留中の一覧に追加"""
+        now = time.time()
+        if not self._pending and not self._rescan:
+            self._first_event = now
+        self._last_event = now
+        if path:
+            self._pending.add(path)
+        self._rescan = self._rescan or rescan
+
+    def _flush_if_settled(self, force: bool = False):
+        """変更が落ち着いたら保留中の変更をまとめて通知"""
+        if not self._pending and not self._rescan:
+            return
+        now = time.time()
+        if not force and now - self._last_event < self.debounce_seconds and now - self._first_event < self.max_delay:
+            return
+        paths, rescan = sorted(self._pending), self._rescan
+        self._pending, self._rescan = set(), False
+        try:
+            self.on_changes(paths, rescan)
+        except Exception as e:
+            print(f"変更の反映に失敗: {e}")
+
+    def _run_polling(self):
+        """一定間隔でフォルダーを走査し、前回との差分を通知"""
+        snapshot = self._snapshot()
+        while not self.stop_event.wait(self.poll_interval):
+            current = self._snapshot()
+            if current is None or snapshot is None:
+                snapshot = current
+                continue
+            for path, stat in current.items():
+                if snapshot.get(path) != stat:
+                    self._add_change(path)
+            for path in snapshot.keys() - current.keys():
+                self._add_change(path)
+            snapshot = current
+            self._flush_if_settled(force=True)
+
+    def _snapshot(self) -> Optional[Dict[str, tuple]]:
+        """フォルダー内のPDFの (サイズ, 更新日時) を取得"""
+        try:
+            return {path: (size, mtime) for path, size, mtime in scan_pdf_files(self.folder, self.recursive)}
+        except OSError as e:
+            print(f"フォルダーを読み込めません: {self.folder}: {e}")
+            return None
+
+    def _run_inotify(self):
+        """inotifyでフォルダーの変更を監視"""
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        watches = {}
+
+        def add_watch(directory: str):
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), self.WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"{os.strerror(errno)}: {directory}")
+            watches[wd] = directory
+
+        def add_tree(directory: str):
+            add_watch(directory)
+            if not self.recursive:
+                return
+            for current, dirnames, _ in os.walk(directory):
+                for name in dirnames:
+                    add_watch(os.path.join(current, name))
+
+        try:
+            add_tree(self.folder)
+            while not self.stop_event.is_set():
+                readable, _, _ = select.select([fd], [], [], 0.5)
+                if readable:
+                    self._read_inotify_events(fd, watches, add_tree)
+                self._flush_if_settled()
+        finally:
+            os.close(fd)
+
+    def _read_inotify_events(self, fd: int, watches: Dict[int, str], add_tree):
+        """inotifyのイベントを読み込み、PDFの変更を保留中の一覧に追加"""
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+            offset += name_length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # イベントを取りこぼしたのでフォルダー全体を確認し直す
+                self._add_change(rescan=True)
+                continue
+            directory = watches.get(wd)
+            if directory is None:
+                continue
+            if mask & self.IN_IGNORED:
+                watches.pop(wd, None)
+                continue
+            if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                if directory == self.folder:
+                    self._add_change(rescan=True)
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if not self.recursive:
+                    continue
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    # 新しいサブフォルダーを監視対象に加え、既に置かれているPDFも取り込む
+                    try:
+                        add_tree(path)
+                        for pdf_path, _, _ in scan_pdf_files(path, True):
+                            self._add_change(pdf_path)
+                    except OSError as e:
+                        print(f"フォルダーを監視できません: {path}: {e}")
+                        self._add_change(rescan=True)
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    # サブフォルダーごと削除・移動された場合は登録済みの内容と突き合わせる
+                    self._add_change(rescan=True)
+            elif name.lower().endswith(".pdf"):
+                self._add_change(path)
+
+def watch_pdf_folder(search_system):
+    """インデックス作成後にPDFフォルダーを監視し、変更されたファイルだけを随時インデックスに反映"""
+    def apply_changes(paths: List[str], rescan: bool):
+        import_pdf_module(search_system, None if rescan else paths)
+
+    watcher = FolderWatcher(
+        search_system.folder_path,
+        search_system.include_subfolders_index,
+        apply_changes,
+        search_system.stop_requested,
+        debounce_seconds=search_system.settings.get_setting("watch_debounce_seconds") or 2.0,
+        poll_interval=search_system.settings.get_setting("watch_poll_interval") or 60.0,
+        mode=search_system.settings.get_setting("watch_mode") or "auto"
+    )
+    watcher.run()
+
+# 構造のバージョンを記録する前のDBに、後から追加した列（テーブル, 列, 定義）
+_ADDED_COLUMNS = (
+    ("pdf_contents", "file_size", "INTEGER"),
+    ("pdf_contents", "extraction_tier", "TEXT DEFAULT 'full'"),
+    ("pdf_contents", "enrich_pending", "INTEGER DEFAULT 0"),
+    ("pdf_contents", "dir_path", "TEXT"),
+    ("pdf_contents", "file_stem", "TEXT"),
+    ("pdf_contents", "index_status", "TEXT DEFAULT 'complete'"),
+    ("pdf_contents", "page_count", "INTEGER"),
+    ("pdf_contents", "title", "TEXT"),
+    ("pdf_contents", "author", "TEXT"),
+    ("pdf_contents", "producer", "TEXT"),
+    ("pdf_contents", "created", "REAL"),
+    ("extraction_stats", "status", "TEXT"),
+    ("extraction_stats", "limit_reason", "TEXT"),
+)
+
+def _migrate_add_columns(cursor):
+    """構造のバージョンを記録する前のDBに、後から追加した列をそろえる
+
+    それまでのDBはどの列まであるかがまちまちなので、無い列だけを追加して、空の列を補完する
+    """
+    for table, column, definition in _ADDED_COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    # フォルダー・ファイル名の列（検索時の絞り込み用）
+    cursor.execute("SELECT id, file_path FROM pdf_contents WHERE dir_path IS NULL")
+    cursor.executemany(
+        "UPDATE pdf_contents SET dir_path = ?, file_stem = ? WHERE id = ?",
+        [normalize_path_columns(file_path) + (doc_id,) for doc_id, file_path in cursor.fetchall()]
+    )
+    # ページ数は登録済みのページから補う（タイトルや作成者は、ファイルが更新されて抽出し直すまで空のまま）
+    # ページ単位への移行前のDBから移した行は0ページにしか無いため、ページ数は不明（NULL）とする
+    cursor.execute('''
+        UPDATE pdf_contents
+        SET page_count = (SELECT NULLIF(MAX(page_no), 0) FROM pdf_pages WHERE doc_id = pdf_contents.id)
+        WHERE page_count IS NULL
+    ''')
+
+def _migrate_split_pages(cursor):
+    """文書単位で保存していた本文（以前のバージョン）をページ単位のテーブルに移す
+
+    ページ番号不明（0ページ）として移してそのまま検索できるようにし、次回のインデックス作成でページごとに抽出し直す
+    """
+    # 文書単位の全文検索インデックスは使わない
+    for trigger in ("pdf_contents_ai", "pdf_contents_ad", "pdf_contents_au"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS pdf_fts")
+
+    cursor.execute('''
+        INSERT INTO pdf_pages (doc_id, page_no, content)
+        SELECT id, 0, content FROM pdf_contents WHERE content IS NOT NULL
+    ''')
+    # last_modifiedを0にすると変更ありと判定され、再抽出の対象になる
+    cursor.execute("UPDATE pdf_contents SET content = NULL, last_modified = 0 WHERE content IS NOT NULL")
+
+def _migrate_drop_content_index(cursor):
+    """本文全体のB-treeインデックスを削除（部分一致の検索には使えず、DBの容量と書き込みを増やすだけ）"""
+    cursor.execute("DROP INDEX IF EXISTS idx_content")
+    # 空いた領域は、インデックス作成後のメンテナンスですぐに解放する
+    cursor.execute("DELETE FROM index_state WHERE key = 'last_maintenance'")
+
+def _migrate_drop_dir_depth(cursor):
+    """どの検索でも使っていない階層の深さの列とそのインデックスを削除"""
+    cursor.execute("DROP INDEX IF EXISTS idx_dir_depth")
+    cursor.execute("PRAGMA table_info(pdf_contents)")
+    # 列の削除はSQLite 3.35以降（それより前のSQLiteでは、使われない列として残る）
+    if "dir_depth" in {row[1] for row in cursor.fetchall()} and sqlite3.sqlite_version_info >= (3, 35, 0):
+        cursor.execute("ALTER TABLE pdf_contents DROP COLUMN dir_depth")
+
+def _migrate_add_metadata_keys(cursor):
+    """作成者・タイトルの絞り込み用に正規化した列を追加し、部分一致では使えない作成者のインデックスを削除"""
+    cursor.execute("DROP INDEX IF EXISTS idx_author")
+    cursor.execute("PRAGMA table_info(pdf_contents)")
+    columns = {row[1] for row in cursor.fetchall()}
+    for column in ("title_key", "author_key"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE pdf_contents ADD COLUMN {column} TEXT")
+    cursor.execute("SELECT id, title, author FROM pdf_contents WHERE title IS NOT NULL OR author IS NOT NULL")
+    cursor.executemany("UPDATE pdf_contents SET title_key = ?, author_key = ? WHERE id = ?",
+                       [(metadata_search_key(title), metadata_search_key(author), doc_id)
+                        for doc_id, title, author in cursor.fetchall()])
+
+# DBの構造の移行（バージョン, 内容, 処理）。変更を加えるときは、バージョンを1つ増やして末尾に追加し、
+# setup_databaseで新しいDBに作成する構造も合わせて変更する
+SCHEMA_MIGRATIONS = [
+    (1, "以前のDBに無い列を追加", _migrate_add_columns),
+    (2, "本文をページ単位のテーブルに移行", _migrate_split_pages),
+    (3, "本文全体のインデックスを削除", _migrate_drop_content_index),
+    (4, "階層の深さの列を削除", _migrate_drop_dir_depth),
+    (5, "作成者・タイトルの絞り込み用の列を追加", _migrate_add_metadata_keys),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def migrate_schema(conn) -> int:
+    """DBの構造のバージョン（PRAGMA user_version）より新しい移行を順に適用し、適用後のバージョンを返す
+
+    移行ごとにバージョンの更新と同じトランザクションで実行するため、途中で失敗した場合も
+    その移行の前の状態に戻り、次回の起動時にそこから再開する
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    if version > SCHEMA_VERSION:
+        print(f"このインデックスDBは新しいバージョンで作成されています（構造のバージョン: {version}）")
+        return version
+    conn.commit()
+    for target, description, migrate in SCHEMA_MIGRATIONS:
+        if target <= version:
+            continue
+        print(f"インデックスDBの構造を更新中: {description}")
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(target)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+    return version
+
+def maintain_database(db_path: Path, full_vacuum: bool = False) -> Dict:
+    """インデックスDBのメンテナンス（全文検索インデックスの最適化・統計の更新・空き領域の解放）
+
+    空き領域はincremental_vacuumで解放し、auto_vacuumがINCREMENTALでない以前のDBや
+    full_vacuumを指定した場合だけVACUUMでDB全体を作り直す（DBと同じくらいの空き容量と時間が必要）
+    """
+    start_time = time.time()
+    report = {"size_before": os.path.getsize(db_path)}
+    conn = sqlite3.connect(str(db_path), timeout=60)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pdf_pages_fts'")
+        if cursor.fetchone():
+            # 差分更新のたびに増える全文検索インデックスの小さな断片を1つにまとめる
+            cursor.execute("INSERT INTO pdf_pages_fts(pdf_pages_fts) VALUES ('optimize')")
+            conn.commit()
+        # 検索の実行計画に使う統計を更新
+        cursor.execute("ANALYZE")
+        conn.commit()
+
+        cursor.execute("PRAGMA auto_vacuum")
+        auto_vacuum = cursor.fetchone()[0]
+        cursor.execute("PRAGMA freelist_count")
+        report["free_pages"] = cursor.fetchone()[0]
+        if full_vacuum or (auto_vacuum != 2 and report["free_pages"]):
+            # 以前のDBもここでINCREMENTALに切り替わり、次回からは空き領域だけを解放できる
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+            report["vacuum"] = "full"
+        elif auto_vacuum == 2:
+            cursor.execute("PRAGMA incremental_vacuum")
+            cursor.fetchall()
+            report["vacuum"] = "incremental"
+        else:
+            report["vacuum"] = "none"
+
+        cursor.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES ('last_maintenance', ?)",
+                       (time.time(),))
+        conn.commit()
+        # WALファイルに残った分もDBに書き戻して切り詰める
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor.fetchall()
+    finally:
+        conn.close()
+    report["size_after"] = os.path.getsize(db_path)
+    report["elapsed_seconds"] = round(time.time() - start_time, 3)
+    return report
+
+def import_pdf_module(search_system, changed_paths: Optional[List[str]] = None):
+    """PDFモジュールのインポートとインデックス作成を別スレッドで実行
+
+    changed_paths を指定した場合は、フォルダー全体を走査せずにそのファイルだけを更新する
+    """
+    try:
+        import pdfplumber  # noqa: F401  モジュールが無い場合はここで検出
+        from pypdf import PdfReader  # noqa: F401
+
+        def should_exclude_file(file_path: Path) -> bool:
+            """ファイルを検索対象から除外すべきかを判定"""
+            return search_system.should_exclude_file(file_path)  # クラスのメソッドを使用
+
+        def setup_page_index(cursor):
+            """ページ単位のテーブルのトリガーとFTS5全文検索インデックスの作成"""
+            # 文書を削除したらページも削除
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS pdf_contents_pages_ad AFTER DELETE ON pdf_contents BEGIN
+                    DELETE FROM pdf_pages WHERE doc_id = old.id;
+                END
+            ''')
+
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pdf_pages_fts'")
+            fts_exists = cursor.fetchone() is not None
+
+            try:
+                # 日本語のようにスペースで区切られない文章も部分一致で検索できるようtrigramを使用
+                cursor.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS pdf_pages_fts USING fts5(
+                        content,
+                        content='pdf_pages',
+                        content_rowid='id',
+                        tokenize='trigram'
+                    )
+                ''')
+            except sqlite3.OperationalError as e:
+                # FTS5/trigramに未対応のSQLiteではLIKE検索のまま動作させる
+                print(f"全文検索インデックスを作成できません（LIKE検索を使用します）: {e}")
+                return
+
+            # ページの追加・更新・削除をトリガーで全文検索インデックスに反映
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS pdf_pages_ai AFTER INSERT ON pdf_pages BEGIN
+                    INSERT INTO pdf_pages_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS pdf_pages_ad AFTER DELETE ON pdf_pages BEGIN
+                    INSERT INTO pdf_pages_fts(pdf_pages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS pdf_pages_au AFTER UPDATE OF content ON pdf_pages BEGIN
+                    INSERT INTO pdf_pages_fts(pdf_pages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    INSERT INTO pdf_pages_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            ''')
+
+            if not fts_exists:
+                # 登録済みのページから全文検索インデックスを構築
+                print("全文検索インデックスを構築中...")
+                cursor.execute("INSERT INTO pdf_pages_fts(pdf_pages_fts) VALUES ('rebuild')")
+
+        def renormalize_index(conn):
+            """文字の正規化の方式が変わった場合に、登録済みの本文とファイル名の列を正規化し直す
+
+            PDFからテキストを抽出し直す必要はなく、全文検索インデックスはトリガーで更新される。
+            正規化は何度かけても結果が変わらないため、中断しても次回に最初からやり直せば済む。
+            （DBの構造ではなく保存した本文の状態なので、SCHEMA_MIGRATIONSとは別にバージョンを記録する。
+            件数が多いと時間がかかるため、1つのトランザクションにまとめず、中断できるようにしている）
+            """
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM index_state WHERE key = 'normalization_version'")
+            row = cursor.fetchone()
+            if row and row[0] >= NORMALIZATION_VERSION:
+                return
+
+            cursor.execute("SELECT COUNT(*) FROM pdf_pages")
+            total = cursor.fetchone()[0]
+            if total:
+                print("検索用の文字の正規化を更新中...")
+            last_id = 0
+            done = 0
+            while done < total:
+                if search_system.stop_requested.is_set():
+                    return
+                cursor.execute("SELECT id, content FROM pdf_pages WHERE id > ? ORDER BY id LIMIT 500", (last_id,))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                updates = []
+                for page_id, content in rows:
+                    normalized = normalize_text(content or "")
+                    if content is not None and normalized != content:
+                        updates.append((normalized, page_id))
+                cursor.executemany("UPDATE pdf_pages SET content = ? WHERE id = ?", updates)
+                commit_changes(conn)
+                done += len(rows)
+                search_system.indexing_progress["status"] = f"検索用の文字の正規化を更新中...（{done}/{total}ページ）"
+
+            cursor.execute("SELECT id, file_path, title, author FROM pdf_contents")
+            cursor.executemany("UPDATE pdf_contents SET file_stem = ?, title_key = ?, author_key = ? WHERE id = ?",
+                               [(normalize_path_columns(file_path)[1], metadata_search_key(title),
+                                 metadata_search_key(author), doc_id)
+                                for doc_id, file_path, title, author in cursor.fetchall()])
+            cursor.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES ('normalization_version', ?)",
+                           (NORMALIZATION_VERSION,))
+            commit_changes(conn)
+
+        def setup_database():
+            """データベースとテーブルの初期設定（以前のDBはSCHEMA_MIGRATIONSで現在の構造に移行する）"""
+            os.makedirs(os.path.dirname(search_system.db_path), exist_ok=True)
+            conn = sqlite3.connect(str(search_system.db_path))
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pdf_contents'")
+                new_database = cursor.fetchone() is None
+                if new_database:
+                    # テーブルの作成前にだけ変更できる（削除で空いた領域をメンテナンスで少しずつ解放する）
+                    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+                # テーブルは現在の構造で作成する（以前のDBのテーブルはそのまま残り、下の移行で更新する）
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS pdf_contents (
+                        id INTEGER PRIMARY KEY,
+                        file_path TEXT UNIQUE,
+                        content TEXT,
+                        last_modified REAL,
+                        created_at REAL,
+                        updated_at REAL,
+                        file_size INTEGER,
+                        extraction_tier TEXT DEFAULT 'full',
+                        enrich_pending INTEGER DEFAULT 0,
+                        dir_path TEXT,
+                        file_stem TEXT,
+                        index_status TEXT DEFAULT 'complete',
+                        page_count INTEGER,
+                        title TEXT,
+                        author TEXT,
+                        producer TEXT,
+                        created REAL,
+                        title_key TEXT,
+                        author_key TEXT
+                    )
+                ''')
+
+                # インデックスの状態（検索結果のキャッシュを無効にする世代番号など）
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS index_state (
+                        key TEXT PRIMARY KEY,
+                        value
+                    )
+                ''')
+                cursor.execute("INSERT OR IGNORE INTO index_state (key, value) VALUES ('generation', 0)")
+
+                # ファイルごとのテキスト抽出の統計（時間のかかるファイルの調査用）
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS extraction_stats (
+                        file_path TEXT,
+                        tier TEXT,
+                        extractor TEXT,
+                        fallback INTEGER,
+                        pages INTEGER,
+                        bytes_in INTEGER,
+                        chars_out INTEGER,
+                        wall_seconds REAL,
+                        cpu_seconds REAL,
+                        error TEXT,
+                        extracted_at REAL,
+                        status TEXT,
+                        limit_reason TEXT,
+                        PRIMARY KEY (file_path, tier)
+                    )
+                ''')
+                # ページごとの本文
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS pdf_pages (
+                        id INTEGER PRIMARY KEY,
+                        doc_id INTEGER NOT NULL,
+                        page_no INTEGER NOT NULL,
+                        content TEXT
+                    )
+                ''')
+                if new_database:
+                    # 新しいDBは最新の構造で作成したので、移行は不要
+                    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.commit()
+                migrate_schema(conn)
+
+                # 検索結果の絞り込みに使う列（フォルダー・ファイル名・文書情報）のインデックス
+                for column in ("dir_path", "file_stem", "last_modified", "file_size",
+                               "page_count", "created"):
+                    cursor.execute(f'''
+                        CREATE INDEX IF NOT EXISTS idx_{column}
+                        ON pdf_contents({column})
+                    ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_enrich_pending
+                    ON pdf_contents(enrich_pending)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_extraction_stats_wall
+                    ON extraction_stats(wall_seconds)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_pdf_pages_doc
+                    ON pdf_pages(doc_id, page_no)
+                ''')
+                
+                setup_page_index(cursor)
+                conn.commit()
+
+                # WALモードにして、インデックス作成中も検索側が読み込めるようにする
+                # （WALに対応していない共有フォルダーでは設定でDELETEなどに変更する）
+                journal_mode = (search_system.settings.get_setting("journal_mode") or "WAL").upper()
+                if journal_mode not in ("WAL", "DELETE", "TRUNCATE", "PERSIST"):
+                    journal_mode = "WAL"
+                cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+                cursor.fetchone()
+
+                renormalize_index(conn)
+            finally:
+                conn.close()
+        def iter_extracted_texts(tasks: List[tuple]):
+            """(パス, 抽出方式, 上限の設定) のリストを受け取り、抽出の終わったPDFから順に
+            (パス, ページのリスト, エラー, 抽出の統計) を返す
+
+            抽出時間の上限を過ぎても終わらないファイルは、ワーカープロセスごと止めて登録を見送る
+            （同時に抽出中だったほかのファイルは、新しいワーカーで抽出し直す）。
+            ワーカーに渡せなかったファイルや、抽出中にワーカーが異常終了したファイルはエラーとして返す
+            """
+            workers = min(search_system.index_workers, len(tasks))
+            max_seconds = search_system.extraction_limits.get("max_seconds") or 0
+            if workers <= 1 and not max_seconds:
+                for task in tasks:
+                    yield _extract_text_worker(task)
+                return
+            # 時間の上限がある場合は、1プロセスでもワーカープロセスで抽出する（このプロセスでは止められない）
+            workers = max(workers, 1)
+            timeout = max_seconds + EXTRACT_TIMEOUT_GRACE_SECONDS if max_seconds else None
+
+            # 開始の知らせはワーカーが直後に異常終了しても届くよう、書き込みが同期的なSimpleQueueで受け取る
+            start_notices = multiprocessing.SimpleQueue()
+
+            def start_pool():
+                # pdfplumberのメモリ増加を抑えるため、一定数のファイルを処理したワーカーは入れ替える
+                return multiprocessing.Pool(processes=workers, maxtasksperchild=search_system.worker_max_tasks,
+                                            initializer=_init_extract_worker, initargs=(start_notices,))
+
+            def submit(task):
+                def failed(error):
+                    finished.put(extraction_error_result(task, f"抽出に失敗しました: {error}"))
+                pool.apply_async(_extract_text_worker, (task,), callback=finished.put, error_callback=failed)
+
+            def find_lost(now: float) -> List[str]:
+                """抽出中に終了したワーカーで処理していたファイル（結果が返ってこない）を探す"""
+                while not start_notices.empty():
+                    path, pid = start_notices.get()
+                    if path in running:
+                        worker_pids[path] = pid
+                alive = {process.pid for process in multiprocessing.active_children()}
+                lost = []
+                for path, pid in worker_pids.items():
+                    if pid in alive:
+                        continue
+                    # 入れ替えで終了する直前に返した結果が届くまで、少し待ってから判断する
+                    if now - exited_at.setdefault(path, now) > WORKER_EXIT_GRACE_SECONDS:
+                        lost.append(path)
+                return lost
+
+            # 抽出は複数プロセスに分散し、DBへの書き込みは呼び出し側の1スレッドだけが行う
+            # 同時に渡すのはワーカーの数までにして、渡した時刻を抽出の開始時刻とみなす
+            pending = deque(tasks)
+            running = {}  # パス → (task, 開始時刻)
+            worker_pids = {}  # パス → 抽出しているワーカーのプロセスID
+            exited_at = {}  # パス → ワーカーの終了に気づいた時刻
+            finished = Queue()
+            pool = start_pool()
+            try:
+                while pending or running:
+                    while pending and len(running) < workers:
+                        task = pending.popleft()
+                        running[task[0]] = (task, time.monotonic())
+                        submit(task)
+                    try:
+                        result = finished.get(timeout=0.5)
+                    except Empty:
+                        if search_system.stop_requested.is_set():
+                            return  # 抽出中のファイルの終了を待たずに中断する
+                        result = None
+                    if result is not None:
+                        worker_pids.pop(result[0], None)
+                        exited_at.pop(result[0], None)
+                        # 止めたワーカーが直前に返した結果など、やり直し中のファイルの重複は捨てる
+                        if running.pop(result[0], None) is not None:
+                            yield result
+                        continue
+
+                    now = time.monotonic()
+                    for path in find_lost(now):
+                        task, _ = running.pop(path)
+                        del worker_pids[path], exited_at[path]
+                        yield extraction_error_result(task, "抽出中にワーカープロセスが終了しました")
+                    expired = [path for path, (_, started) in running.items()
+                               if timeout and now - started > timeout]
+                    if not expired:
+                        continue
+                    pool.terminate()
+                    pool.join()
+                    for path in expired:
+                        task, started = running.pop(path)
+                        yield extraction_timeout_result(task, now - started)
+                    pending.extendleft(reversed([task for task, _ in running.values()]))
+                    running.clear()
+                    worker_pids.clear()
+                    exited_at.clear()
+                    find_lost(now)  # 止めたワーカーから届いていた開始の知らせを捨てる
+                    pool = start_pool()
+            finally:
+                pool.terminate()
+                pool.join()
+                start_notices.close()
+
+        def is_modified(stored, size: int, mtime: float) -> bool:
+            """登録済みの (サイズ, 更新日時) と比較してファイルが変更されたかを判定"""
+            stored_size, stored_mtime = stored
+            if stored_size is None:
+                # file_size列の追加前に登録された行は更新日時だけで判定する
+                return stored_mtime < mtime
+            return stored_size != size or stored_mtime != mtime
+
+        def detect_changes(cursor) -> Optional[Dict[str, list]]:
+            """フォルダー内のPDFと登録済みのインデックスを比較し、追加・変更・削除を検出"""
+            base = str(Path(search_system.folder_path))
+            recursive = search_system.include_subfolders_index
+
+            # 登録済みファイルの (サイズ, 更新日時) を1回のクエリでまとめて読み込み、メモリ上で比較する
+            cursor.execute("SELECT file_path, file_size, last_modified FROM pdf_contents")
+            manifest = {path: (size, mtime) for path, size, mtime in cursor.fetchall()}
+
+            report = {"added": [], "changed": [], "deleted": [], "unchanged": 0}
+            seen = set()
+            failed_dirs = []
+            size_backfill = []
+            for path, size, mtime in scan_pdf_files(base, recursive, failed_dirs):
+                if search_system.stop_requested.is_set():
+                    return None
+                seen.add(path)
+                if len(seen) % 200 == 0:
+                    search_system.indexing_progress["status"] = f"PDFファイルの変更を確認中...（{len(seen)}件）"
+                if should_exclude_file(Path(path)):
+                    continue
+
+                stored = manifest.get(path)
+                if stored is None:
+                    report["added"].append((path, size, mtime))
+                    continue
+
+                changed = is_modified(stored, size, mtime)
+                if not changed and stored[0] is None:
+                    # file_size列の追加前に登録された行はサイズを補完する
+                    size_backfill.append((size, path))
+
+                if changed:
+                    report["changed"].append((path, size, mtime))
+                else:
+                    report["unchanged"] += 1
+
+            # 検索フォルダーの範囲内で、ディスク上に見つからなかったファイルを削除済みとする
+            prefix = base.rstrip(os.sep) + os.sep
+            failed_prefixes = tuple(d + os.sep for d in failed_dirs)
+            for path in manifest:
+                if path in seen:
+                    continue
+                if recursive:
+                    in_scope = path.startswith(prefix)
+                else:
+                    in_scope = os.path.dirname(path) == base
+                if in_scope and not (failed_prefixes and path.startswith(failed_prefixes)):
+                    report["deleted"].append(path)
+
+            if size_backfill:
+                cursor.executemany("UPDATE pdf_contents SET file_size = ? WHERE file_path = ?", size_backfill)
+                cursor.connection.commit()
+
+            return report
+
+        def detect_path_changes(cursor, paths: List[str]) -> Dict[str, list]:
+            """フォルダー監視で通知されたファイルだけを登録済みの内容と比較"""
+            report = {"added": [], "changed": [], "deleted": [], "unchanged": 0}
+            for path in sorted(set(paths)):
+                cursor.execute("SELECT file_size, last_modified FROM pdf_contents WHERE file_path = ?", (path,))
+                stored = cursor.fetchone()
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    if stored:
+                        report["deleted"].append(path)
+                    continue
+                if should_exclude_file(Path(path)):
+                    continue
+
+                if stored is None:
+                    report["added"].append((path, stat.st_size, stat.st_mtime))
+                elif is_modified(stored, stat.st_size, stat.st_mtime):
+                    report["changed"].append((path, stat.st_size, stat.st_mtime))
+                else:
+                    report["unchanged"] += 1
+            return report
+
+        def commit_changes(conn):
+            """変更をコミットし、インデックスの世代番号を進めて古い検索結果のキャッシュを無効にする"""
+            conn.execute("UPDATE index_state SET value = value + 1 WHERE key = 'generation'")
+            conn.commit()
+
+        def prune_deleted_files(cursor, deleted: List[str]):
+            """削除されたファイルをインデックスから取り除く"""
+            if not deleted:
+                return
+            cursor.executemany("DELETE FROM pdf_contents WHERE file_path = ?", [(path,) for path in deleted])
+            cursor.executemany("DELETE FROM extraction_stats WHERE file_path = ?", [(path,) for path in deleted])
+            commit_changes(cursor.connection)
+
+        def replace_pages(cursor, doc_id: int, pages: List[str]):
+            """文書のページごとのテキストを置き換える（テキストの無いページは保存しない）"""
+            cursor.execute("DELETE FROM pdf_pages WHERE doc_id = ?", (doc_id,))
+            cursor.executemany(
+                "INSERT INTO pdf_pages (doc_id, page_no, content) VALUES (?, ?, ?)",
+                [(doc_id, page_no, text) for page_no, text in enumerate(pages, 1) if text]
+            )
+
+        def record_stats(cursor, pdf_path: str, stats: Dict, error: Optional[str]):
+            """ファイルごとの抽出の統計を記録（同じファイル・抽出方式の以前の記録は置き換える）"""
+            cursor.execute('''
+                INSERT OR REPLACE INTO extraction_stats
+                (file_path, tier, extractor, fallback, pages, bytes_in, chars_out,
+                 wall_seconds, cpu_seconds, error, extracted_at, status, limit_reason)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (pdf_path, stats.get("tier"), stats.get("extractor"), int(bool(stats.get("fallback"))),
+                  stats.get("pages"), stats.get("bytes_in"), stats.get("chars_out"),
+                  stats.get("wall_seconds"), stats.get("cpu_seconds"), error, time.time(),
+                  stats.get("status"), stats.get("limit_reason")))
+
+        def write_extracted_texts(conn, tasks: List[tuple], store):
+            """PDFからテキストを抽出し、store(cursor, パス, ページのリスト, 登録状態, 文書情報)でDBに書き込む
+
+            一定件数・一定時間ごとにコミットし、中断しても処理済みの分は次回に引き継ぐ
+            """
+            cursor = conn.cursor()
+            uncommitted = 0
+            last_commit = time.time()
+            start_time = time.time()
+            done = 0
+            try:
+                for pdf_path, pages, error, stats in iter_extracted_texts(tasks):
+                    if search_system.stop_requested.is_set():
+                        break
+                    progress = search_system.indexing_progress
+                    progress["current"] += 1
+                    done += 1
+                    elapsed = time.time() - start_time
+                    if elapsed > 0:
+                        progress["rate"] = done / elapsed
+                        progress["eta_seconds"] = max(progress["total"] - progress["current"], 0) / progress["rate"]
+
+                    record_stats(cursor, pdf_path, stats, error)
+                    uncommitted += 1
+                    if error:
+                        # 読み込めなかったファイルは次回も再試行する
+                        print(f"Error processing {pdf_path}: {error}")
+                    else:
+                        # テキストの無いファイルや上限で打ち切ったファイルも登録し、変更されるまで再抽出しない
+                        try:
+                            metadata = dict(stats.get("metadata") or {}, page_count=stats.get("page_count"))
+                            store(cursor, pdf_path, pages, stats.get("status", "complete"), metadata)
+                        except Exception as e:
+                            print(f"Error processing {pdf_path}: {e}")
+
+                    if (uncommitted >= search_system.commit_batch_files or
+                            time.time() - last_commit >= search_system.commit_batch_seconds):
+                        commit_changes(conn)
+                        uncommitted = 0
+                        last_commit = time.time()
+            finally:
+                if uncommitted:
+                    commit_changes(conn)
+
+        def enrich_deferred_files(conn):
+            """fastで登録済みのファイルを、レイアウトと表を含む内容（full）に置き換える"""
+            cursor = conn.cursor()
+            cursor.execute("SELECT file_path, last_modified FROM pdf_contents WHERE enrich_pending = 1")
+            targets = dict(cursor.fetchall())
+            if not targets:
+                return
+
+            search_system.indexing_progress.update({
+                "status": "レイアウトと表のテキストを追加中。検索はそのまま行えます。...",
+                "total": len(targets), "current": 0, "rate": 0.0, "eta_seconds": None
+            })
+
+            def store_enriched(cursor, pdf_path: str, pages: List[str], status: str, metadata: Dict):
+                # 抽出中にファイルが更新された場合は、次回の差分更新に任せる
+                cursor.execute('''
+                    SELECT id FROM pdf_contents
+                    WHERE file_path = ? AND last_modified = ? AND enrich_pending = 1
+                ''', (pdf_path, targets[pdf_path]))
+                row = cursor.fetchone()
+                if not row:
+                    return
+                if status != "complete":
+                    # 上限で打ち切った場合は、登録済みの本文（fast）をそのまま使い、再抽出もしない
+                    cursor.execute("UPDATE pdf_contents SET enrich_pending = 0 WHERE id = ?", (row[0],))
+                    return
+                # 文書情報は、fastで読めなかった項目だけを補う
+                cursor.execute('''
+                    UPDATE pdf_contents
+                    SET extraction_tier = 'full', enrich_pending = 0, updated_at = ?,
+                        title = COALESCE(title, ?), author = COALESCE(author, ?),
+                        producer = COALESCE(producer, ?), created = COALESCE(created, ?),
+                        title_key = COALESCE(title_key, ?), author_key = COALESCE(author_key, ?)
+                    WHERE id = ?
+                ''', (time.time(), metadata.get("title"), metadata.get("author"),
+                      metadata.get("producer"), metadata.get("created"),
+                      metadata_search_key(metadata.get("title")), metadata_search_key(metadata.get("author")),
+                      row[0]))
+                replace_pages(cursor, row[0], pages)
+
+            write_extracted_texts(conn, [(path, "full", search_system.extraction_limits) for path in targets],
+                                  store_enriched)
+
+        def index_pdfs():
+            """PDFファイルのインデックス作成（差分更新）"""
+            conn = sqlite3.connect(str(search_system.db_path))
+            cursor = conn.cursor()
+            
+            try:
+                # インデックス作成開始を表示
+                search_system.indexing_progress.update({
+                    "status": "PDFファイルの変更を確認中...",
+                    "total": 0, "current": 0, "rate": 0.0, "eta_seconds": None
+                })
+
+                if changed_paths is None:
+                    report = detect_changes(cursor)
+                else:
+                    report = detect_path_changes(cursor, changed_paths)
+                if report is None:
+                    return
+                search_system.change_report = report
+                print(f"変更の検出: 追加 {len(report['added'])}件 / 変更 {len(report['changed'])}件 / "
+                      f"削除 {len(report['deleted'])}件 / 変更なし {report['unchanged']}件")
+
+                prune_deleted_files(cursor, report["deleted"])
+
+                # テキスト抽出が必要なファイル（新規・更新）
+                pending = {path: (size, mtime, False) for path, size, mtime in report["added"]}
+                pending.update({path: (size, mtime, True) for path, size, mtime in report["changed"]})
+
+                search_system.indexing_progress["status"] = "インデックスをサーチ中。既存のインデックス分は検索できます。..."
+                search_system.indexing_progress["total"] = len(pending)
+
+                tiers = {path: search_system.extraction_tier_for(path) for path in pending}
+                tasks = [(path, "fast" if tier == "deferred" else tier, search_system.extraction_limits)
+                         for path, tier in tiers.items()]
+
+                def store_content(cursor, pdf_path: str, pages: List[str], status: str, metadata: Dict):
+                    file_size, last_modified, exists = pending[pdf_path]
+                    tier = tiers[pdf_path]
+                    stored_tier = "fast" if tier == "deferred" else tier
+                    # 上限で打ち切ったファイルは、後から表・レイアウトを追加する対象にしない
+                    enrich_pending = 1 if tier == "deferred" and status == "complete" else 0
+                    current_time = time.time()
+                    document_info = (metadata.get("page_count"), metadata.get("title"), metadata.get("author"),
+                                     metadata.get("producer"), metadata.get("created"),
+                                     metadata_search_key(metadata.get("title")),
+                                     metadata_search_key(metadata.get("author")))
+                    if exists:
+                        cursor.execute('''
+                            UPDATE pdf_contents 
+                            SET content = NULL, last_modified = ?, file_size = ?, updated_at = ?,
+                                extraction_tier = ?, enrich_pending = ?, index_status = ?,
+                                page_count = ?, title = ?, author = ?, producer = ?, created = ?,
+                                title_key = ?, author_key = ?
+                            WHERE file_path = ?
+                        ''', (last_modified, file_size, current_time,
+                              stored_tier, enrich_pending, status) + document_info + (pdf_path,))
+                        cursor.execute("SELECT id FROM pdf_contents WHERE file_path = ?", (pdf_path,))
+                        doc_id = cursor.fetchone()[0]
+                    else:
+                        cursor.execute('''
+                            INSERT INTO pdf_contents 
+                            (file_path, last_modified, file_size, created_at, updated_at,
+                             extraction_tier, enrich_pending, index_status, dir_path, file_stem,
+                             page_count, title, author, producer, created, title_key, author_key)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', (pdf_path, last_modified, file_size, current_time, current_time,
+                              stored_tier, enrich_pending, status) + normalize_path_columns(pdf_path) + document_info)
+                        doc_id = cursor.lastrowid
+                    # 本文はページ単位で保存する
+                    replace_pages(cursor, doc_id, pages)
+
+                write_extracted_texts(conn, tasks, store_content)
+
+                if not search_system.stop_requested.is_set():
+                    enrich_deferred_files(conn)
+            finally:
+                conn.close()
+
+        def run_scheduled_maintenance():
+            """前回のメンテナンスから設定の間隔以上経っていれば、インデックスDBのメンテナンスを行う"""
+            interval_hours = search_system.maintenance_interval_hours
+            if interval_hours <= 0:
+                return
+            conn = sqlite3.connect(str(search_system.db_path))
+            try:
+                row = conn.execute("SELECT value FROM index_state WHERE key = 'last_maintenance'").fetchone()
+            finally:
+                conn.close()
+            if row and time.time() - row[0] < interval_hours * 3600:
+                return
+            search_system.indexing_progress["status"] = "インデックスDBのメンテナンス中..."
+            try:
+                report = maintain_database(search_system.db_path)
+                print(f"インデックスDBのメンテナンス: {report['size_before'] / 1024 / 1024:.1f}MB → "
+                      f"{report['size_after'] / 1024 / 1024:.1f}MB（{report['elapsed_seconds']}秒）")
+            except sqlite3.Error as e:
+                print(f"インデックスDBのメンテナンスに失敗: {e}")
+
+        # データベースのセットアップを実行
+        setup_database()
+        # インデックス作成を開始
+        index_pdfs()
+        if not search_system.stop_requested.is_set():
+            run_scheduled_maintenance()
+        
+    except Exception as e:
+        print(f"Error in background indexing: {e}")
+    finally:
+        search_system.indexing_complete.set()
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """検索サーバーのリクエストを処理する（リクエストごとに別のスレッドで実行される）
+
+    GET /search?q=...&exact=1&subfolders=1&limit=N  検索結果を1行1件のJSON（JSON Lines）で順に返す
+                                                     （mode=regex / mode=wildcard でパターン検索、
+                                                      modified_after=2024-04 などSEARCH_FILTERSで絞り込み）
+    GET /snippets?path=...&q=...&exact=1&mode=...    1ファイル分の該当ページとコンテキスト
+    GET /status                                      インデックス作成の進捗とキャッシュの状態
+    GET /slowest?limit=N                             テキスト抽出に時間がかかったファイル
+    """
+    server_version = "PDFSearch/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        search_system = self.server.search_system
+
+        def param(name: str, default: str = "") -> str:
+            return params.get(name, [default])[0]
+
+        def flag(name: str) -> bool:
+            return param(name).lower() in ("1", "true", "yes")
+
+        try:
+            if url.path == "/search":
+                query = param("q")
+                if not query.strip():
+                    self._send_json(400, {"error": "q を指定してください"})
+                    return
+                try:
+                    limit = int(param("limit", "0"))
+                except ValueError:
+                    limit = 0
+                exact_match = flag("exact")
+                pattern_mode = param("mode")
+                filters = {name: param(name) for name in SEARCH_FILTERS if name in params}
+                # 検索結果を送り始める前に、パターンや絞り込みの条件の誤りをエラーとして返す
+                try:
+                    if pattern_mode:
+                        build_search_regex(query, pattern_mode)
+                    normalize_search_filters(filters)
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+                results = search_system.iter_search(prepare_query(query, exact_match), exact_match,
+                                                    flag("subfolders"), limit or None,
+                                                    refine_from=param("refine") or None,
+                                                    details=param("details", "1") != "0",
+                                                    pattern_mode=pattern_mode, filters=filters)
+                # 見つかった結果から順に送り、クライアント側でもすぐに表示できるようにする
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+                self.end_headers()
+                for result in results:
+                    self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+            elif url.path == "/snippets":
+                exact_match = flag("exact")
+                try:
+                    result = search_system.get_document_snippets(
+                        param("path"), prepare_query(param("q"), exact_match), exact_match, param("mode")
+                    )
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+                if result is None:
+                    self._send_json(404, {"error": "該当するファイルがありません"})
+                else:
+                    self._send_json(200, result)
+            elif url.path == "/status":
+                self._send_json(200, search_system.get_status())
+            elif url.path == "/slowest":
+                try:
+                    limit = int(param("limit", "20"))
+                except ValueError:
+                    limit = 20
+                self._send_json(200, {"files": search_system.get_slowest_files(limit)})
+            else:
+                self._send_json(404, {"error": "not found"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 結果を送り終える前にクライアントが切断した
+
+    def _send_json(self, status: int, data: Dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve_search_system(search_system: PDFSearchSystem, host: str, port: int) -> ThreadingHTTPServer:
+    """1つのPDFSearchSystem（接続プールと検索キャッシュ）を複数の利用者で共有する検索サーバーを作成"""
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    server.daemon_threads = True
+    server.search_system = search_system
+    return server
+
+class SearchServiceClient:
+    """検索サーバーに問い合わせるクライアント
+
+    画面からはPDFSearchSystemと同じように使える。インデックスの作成はサーバーが行うため、
+    このPCではPDFの走査もテキスト抽出も行わない。
+    """
+    STATUS_INTERVAL = 2  # サーバーの状態を確認する間隔（秒）
+
+    def __init__(self, server_url: str, timeout: float = 30):
+        if "://" not in server_url:
+            server_url = f"http://{server_url}"
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.include_subfolders_index = False
+        self.watch_folder = False
+        self.indexing_complete = threading.Event()
+        self.stop_requested = threading.Event()
+        self.indexing_progress = {"total": 0, "current": 0, "status": "検索サーバーに接続中..."}
+        threading.Thread(target=self._poll_status, daemon=True).start()
+
+    def _request(self, endpoint: str, **params):
+        url = f"{self.server_url}{endpoint}"
+        if params:
+            url += "?" + urlencode(params)
+        return urlopen(url, timeout=self.timeout)
+
+    def _request_checked(self, endpoint: str, **params):
+        """_requestと同じだが、検索語の誤り（400）はサーバーのメッセージでValueErrorにする"""
+        try:
+            return self._request(endpoint, **params)
+        except HTTPError as e:
+            if e.code == 400:
+                try:
+                    message = json.load(e)["error"]
+                except (ValueError, KeyError):
+                    message = str(e)
+                raise ValueError(message) from e
+            raise
+
+    def _poll_status(self):
+        """サーバー側のインデックス作成の進捗を定期的に取得"""
+        while not self.stop_requested.is_set():
+            try:
+                with self._request("/status") as response:
+                    status = json.load(response)
+                self.include_subfolders_index = status["include_subfolders_index"]
+                self.indexing_progress = status["progress"]
+                if status["complete"]:
+                    self.indexing_complete.set()
+                else:
+                    self.indexing_complete.clear()
+            except (OSError, ValueError, KeyError) as e:
+                self.indexing_progress = {"total": 0, "current": 0, "status": f"検索サーバーに接続できません: {e}"}
+                self.indexing_complete.clear()
+            self.stop_requested.wait(self.STATUS_INTERVAL)
+
+    def stop_indexing(self):
+        """状態の確認を止める（サーバー側のインデックス作成は止めないので、完了を待つ必要はない）"""
+        self.stop_requested.set()
+        self.indexing_complete.set()
+
+    def close(self):
+        self.stop_indexing()
+
+    def search(self, query: str, exact_match: bool = False, include_subfolders: bool = False,
+               limit: Optional[int] = None, details: bool = True, pattern_mode: str = "",
+               filters: Optional[Dict] = None) -> List[Dict]:
+        return list(self.iter_search(query, exact_match, include_subfolders, limit,
+                                     details=details, pattern_mode=pattern_mode, filters=filters))
+
+    def iter_search(self, query: str, exact_match: bool = False, include_subfolders: bool = False,
+                    limit: Optional[int] = None, cancel_event: Optional[threading.Event] = None,
+                    refine_from: Optional[str] = None, details: bool = True, pattern_mode: str = "",
+                    filters: Optional[Dict] = None):
+        """サーバーで検索し、届いた結果から順に1件ずつ返す（中断すると接続を閉じ、サーバー側の検索も止まる）"""
+        params = dict(q=query, exact=int(exact_match), subfolders=int(include_subfolders), limit=limit or 0,
+                      details=int(details))
+        if refine_from:
+            params["refine"] = refine_from
+        if pattern_mode:
+            params["mode"] = pattern_mode
+        for name, value in (filters or {}).items():
+            if value is not None and str(value).strip():
+                params[name] = value
+        with self._request_checked("/search", **params) as response:
+            for line in response:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                if line.strip():
+                    yield json.loads(line)
+
+    def get_slowest_files(self, limit: int = 20) -> List[Dict]:
+        with self._request("/slowest", limit=limit) as response:
+            return json.load(response)["files"]
+
+    def get_document_snippets(self, file_path: str, query: str, exact_match: bool = False,
+                              pattern_mode: str = "") -> Optional[Dict]:
+        try:
+            with self._request_checked("/snippets", path=file_path, q=query, exact=int(exact_match),
+                                       mode=pattern_mode) as response:
+                return json.load(response)
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+def run_indexing(search_system):
+    """インデックス作成を行い、その後はフォルダーの変更を監視し続ける"""
+    import_pdf_module(search_system)
+    if search_system.watch_folder and not search_system.stop_requested.is_set():
+        watch_pdf_folder(search_system)
+
+def _indexing_process_main(settings_data: Dict, progress_queue, stop_event):
+    """子プロセスでインデックス作成とフォルダー監視を行い、進捗をキューで親プロセスに送る"""
+    # Ctrl+Cは親プロセスが受け取り、stop_eventで中断を伝える（途中の書き込みを強制終了させない）
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    settings = Settings()
+    settings.settings = settings_data
+    search_system = PDFSearchSystem(settings)
+    finished = threading.Event()
+
+    def relay_progress():
+        last_progress = None
+        complete_sent = False
+        stopping = False
+        while not finished.is_set():
+            if stopping:
+                # 中断を伝えた後はstop_eventがセットされたままなので、終了の方を待つ
+                finished.wait(0.25)
+            elif stop_event.wait(0.25):
+                search_system.stop_indexing()
+                stopping = True
+            # 変化があった場合だけ送る
+            progress = dict(search_system.indexing_progress)
+            if progress != last_progress:
+                progress_queue.put(("progress", progress))
+                last_progress = progress
+            if search_system.indexing_complete.is_set() and not complete_sent:
+                progress_queue.put(("complete", None))
+                complete_sent = True
+
+    relay_thread = threading.Thread(target=relay_progress, daemon=True)
+    relay_thread.start()
+    try:
+        run_indexing(search_system)
+    finally:
+        finished.set()
+        relay_thread.join()
+        progress_queue.put(("progress", dict(search_system.indexing_progress)))
+        progress_queue.put(("complete", None))
+        search_system.close()
+
+def prepare_query(original_query: str, exact_match: bool) -> str:
+    """入力された検索語を内部処理用の検索語に変換"""
+    # 完全一致検索で1語の場合、前後にスペースを追加（内部処理用）
+    query = original_query
+    if exact_match:
+        # スペースで分割して単語数をカウント（連続スペースは1つとして扱う）
+        words = [w for w in query.split() if w]
+        if len(words) == 1:  # 1語の場合のみ
+            query = f" {words[0]} "  # 元の入力形式に関係なく、必ずスペースを追加
+    return query
+
+def main():
+    """メインアプリケーション"""
+    root = tk.Tk()
+    root.title("PDF検索システム")
+    root.geometry("1000x700")
 
     # メインフレーム
     main_frame = tk.Frame(root, padx=20, pady=20)
@@ -616,8 +3441,11 @@ def main():
 ・  スペース区切りで複数ワードでのあいまい検索ができます。（例：機器 故障）
 ・  "Terminal block" などスペースを含むワードを検索するときは、「完全一致検索」にチェックを入れてください。
 ・  1語だけを検索したいときも、「完全一致検索」にチェックを入れてください。
-・  文字やスペースの全角、半角は区別されます。
-・  英単語の大文字小文字は区別されません。
+・  "..." で囲んだ語はフレーズとして検索し、「A NEAR/10 B」で A と B が10文字以内にあるページを検索できます（NEAR は大文字で入力）。
+・  文字やスペースの全角・半角、英字の大文字・小文字、ハイフンや波ダッシュの種類は区別されません。
+・  「入力中に検索」にチェックを入れると、入力の途中から検索結果が表示されます。
+・  「パターン」で正規表現（例：AB-\d{4}）やワイルドカード（例：型式*200V、? は任意の1文字）で検索できます。
+・  「絞り込み」で更新日（例：2024-04-01、2024-04）・ページ数・サイズ・作成者・フォルダーの条件を指定できます。
 ・  検索結果のファイル名を選択して、ダブルクリックするか、Enterキーを押すと、PDFファイルが開きます。
 """
     tk.Label(help_frame, text=help_text, justify=tk.LEFT).pack(anchor='w')
@@ -642,6 +3470,57 @@ def main():
     tk.Checkbutton(option_frame, text="サブフォルダーも検索する", 
                    variable=include_subfolders_search_var).pack(side='left', padx=(5, 5))
 
+    # パターン検索の種類（表示名 → iter_searchのpattern_mode）
+    pattern_modes = {"なし": "", "正規表現": "regex", "ワイルドカード": "wildcard"}
+    tk.Label(option_frame, text="パターン:").pack(side='left', padx=(5, 0))
+    pattern_mode_var = tk.StringVar(value="なし")
+    ttk.Combobox(option_frame, textvariable=pattern_mode_var, values=list(pattern_modes),
+                 state="readonly", width=12).pack(side='left', padx=(5, 5))
+
+    search_as_you_type_var = tk.BooleanVar()
+    tk.Checkbutton(option_frame, text="入力中に検索",
+                   variable=search_as_you_type_var,
+                   command=lambda: save_search_as_you_type()).pack(side='left', padx=(5, 5))
+
+    # 絞り込み（空欄の条件は使わない）
+    filter_frame = tk.LabelFrame(main_frame, text="絞り込み", padx=5, pady=5)
+    filter_frame.pack(fill='x', pady=(0, 10))
+    filter_entries = {}
+
+    def add_filter_entry(name: str, width: int):
+        entry = tk.Entry(filter_frame, width=width)
+        entry.pack(side='left')
+        entry.bind('<Return>', lambda event: perform_search())
+        filter_entries[name] = entry
+
+    for label, low, high, width in (("更新日:", "modified_after", "modified_before", 11),
+                                    ("ページ数:", "min_pages", "max_pages", 5),
+                                    ("サイズ(MB):", "min_size", "max_size", 5)):
+        tk.Label(filter_frame, text=label).pack(side='left', padx=(5, 0))
+        add_filter_entry(low, width)
+        tk.Label(filter_frame, text="～").pack(side='left')
+        add_filter_entry(high, width)
+    tk.Label(filter_frame, text="作成者:").pack(side='left', padx=(5, 0))
+    add_filter_entry("author", 12)
+    tk.Label(filter_frame, text="フォルダー:").pack(side='left', padx=(5, 0))
+    add_filter_entry("folder", 15)
+
+    def get_search_filters() -> Dict:
+        """絞り込み欄の入力をiter_searchのfiltersに変換（サイズはMBからバイトに換算）"""
+        filters = {}
+        for name, entry in filter_entries.items():
+            value = entry.get().strip()
+            if not value:
+                continue
+            if name in ("min_size", "max_size"):
+                try:
+                    value = int(float(value) * 1024 * 1024)
+                except ValueError:
+                    raise ValueError(f"絞り込みの条件が正しくありません: サイズ={value}") from None
+            filters[name] = value
+        normalize_search_filters(filters)
+        return filters
+
     # 結果表示用のペインウィンドウ
     paned = ttk.PanedWindow(main_frame, orient=tk.HORIZONTAL)
     paned.pack(expand=True, fill='both')
@@ -654,13 +3533,9 @@ def main():
     result_count_label = tk.Label(list_frame, text="", anchor='w')
     result_count_label.pack(fill='x')
 
-    # ファイル名リストボックス
-    file_listbox = tk.Listbox(list_frame, width=50)
-    file_listbox.pack(side='left', fill='both', expand=True)
-    
-    list_scrollbar = tk.Scrollbar(list_frame, command=file_listbox.yview)
-    list_scrollbar.pack(side='right', fill='y')
-    file_listbox.configure(yscrollcommand=list_scrollbar.set)
+    # ファイル名リスト（見えている行だけを描画する）
+    result_list = VirtualResultList(list_frame, width=50)
+    result_list.pack(fill='both', expand=True)
 
     # 右側：詳細表示
     detail_frame = tk.Frame(paned)
@@ -668,26 +3543,23 @@ def main():
 
     detail_text = tk.Text(detail_frame, wrap=tk.WORD)
     detail_text.pack(side='left', fill='both', expand=True)
+    detail_text.tag_configure("highlight", background="yellow")
     
     detail_scrollbar = tk.Scrollbar(detail_frame, command=detail_text.yview)
     detail_scrollbar.pack(side='right', fill='y')
     detail_text.configure(yscrollcommand=detail_scrollbar.set)
 
-    # 検索結果を保存する辞書
-    results_dict = {}
+    # 選択した結果の該当ページとコンテキスト（選択したときに取得し、最近の分だけ保持する）
+    detail_cache = OrderedDict()
+    DETAIL_CACHE_SIZE = 64
 
     def update_progress():
         """インデックス作成の進捗を更新"""
+        if search_system is None:
+            return  # 前の検索システムを閉じている間（新しい検索システムで改めて開始する）
         if not search_system.indexing_complete.is_set():
-            current = search_system.indexing_progress["current"]
-            total = search_system.indexing_progress["total"]
-            status = search_system.indexing_progress["status"]
-        
-            if total > 0:
-                subfolder_text = "（サブフォルダーを含む）" if search_system.include_subfolders_index else ""
-                progress_text = f"{status}{subfolder_text} ({current}/{total})"
-            else:
-                progress_text = status
+            subfolder_text = "（サブフォルダーを含む）" if search_system.include_subfolders_index else ""
+            progress_text = format_progress(search_system.indexing_progress, subfolder_text)
                 
             progress_label.config(text=progress_text)
             progress_label.update()
@@ -700,7 +3572,7 @@ def main():
 
     def save_results():
         """検索結果のファイル名一覧をテキストファイルとして保存"""
-        if not results_dict:
+        if not result_list.size():
             messagebox.showwarning("警告", "保存する検索結果がありません")
             return
             
@@ -715,7 +3587,7 @@ def main():
         
         try:
             with open(filepath, "w", encoding="utf-8") as f:
-                for result in results_dict.values():
+                for result in result_list.items:
                     f.write(f"{result['file_name']}\n")
             messagebox.showinfo("成功", f"検索結果を保存しました:\n{filepath}")
         except Exception as e:
@@ -723,13 +3595,7 @@ def main():
 
     def open_selected_pdf(event=None):
         """選択されたPDFファイルを開く"""
-        selection = file_listbox.curselection()
-        if not selection:
-            return
-            
-        selected_index = selection[0]
-        selected_result = results_dict.get(selected_index)
-        
+        selected_result = result_list.selected_item()
         if selected_result:
             pdf_path = selected_result['file_path']
             try:
@@ -738,56 +3604,209 @@ def main():
                 messagebox.showerror("エラー", f"PDFファイルを開けませんでした: {e}")
 
     def show_file_details(event=None):
-        """選択されたファイルの詳細を表示"""
-        selection = file_listbox.curselection()
-        if not selection:
+        """選択されたファイルの詳細を表示（該当ページとコンテキストは選択したときに取得する）"""
+        selected_result = result_list.selected_item()
+        if not selected_result:
             return
-            
-        selected_index = selection[0]
-        selected_result = results_dict.get(selected_index)
-        
-        if selected_result:
-            detail_text.delete('1.0', tk.END)
-            detail_text.insert(tk.END, f"ファイル: {selected_result['file_path']}\n")
-            detail_text.insert(tk.END, f"最終更新: {selected_result['last_modified']}\n")
-            detail_text.insert(tk.END, f"\nコンテキスト:\n{selected_result['context']}\n")
 
-    def perform_search():
-        """検索を実行"""
+        detail_text.delete('1.0', tk.END)
+        detail_text.insert(tk.END, f"ファイル: {selected_result['file_path']}\n")
+        detail_text.insert(tk.END, f"最終更新: {selected_result['last_modified']}\n")
+        # 文書情報（PDFに記録されている項目だけ）
+        for label, key in (("タイトル", "title"), ("作成者", "author"), ("作成日", "created")):
+            if selected_result.get(key):
+                detail_text.insert(tk.END, f"{label}: {selected_result[key]}\n")
+        document_info = []
+        if selected_result.get('page_count'):
+            document_info.append(f"{selected_result['page_count']}ページ")
+        if selected_result.get('file_size') is not None:
+            document_info.append(f"{selected_result['file_size'] / 1024 / 1024:.1f}MB")
+        if document_info:
+            detail_text.insert(tk.END, f"文書: {' / '.join(document_info)}\n")
+
+        key = selected_result['file_path']
+        if key in detail_cache:
+            detail_cache.move_to_end(key)
+            show_snippets(detail_cache[key])
+            return
+        if search_system is None:
+            return  # 設定の変更で検索システムを入れ替えている間
+        detail_text.insert(tk.END, "\nコンテキストを読み込み中...\n", "loading")
+        query, exact_match, pattern_mode = search_state["query"]
+        threading.Thread(target=load_snippets_worker,
+                         args=(search_state["token"], key, query, exact_match, pattern_mode), daemon=True).start()
+
+    def load_snippets_worker(token: int, file_path: str, query: str, exact_match: bool, pattern_mode: str):
+        """バックグラウンドで1ファイル分の該当ページとコンテキストを取得し、画面用のキューに送る"""
+        system = search_system
+        if system is None:
+            return  # 検索システムを閉じている間（終了時や設定の変更時。結果はもう表示しない）
+        try:
+            snippets = system.get_document_snippets(file_path, query, exact_match, pattern_mode)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            snippets = {"error": str(e)}
+        search_results.put((token, "snippets", (file_path, snippets)))
+
+    def show_snippets(snippets: Optional[Dict]):
+        """詳細表示に該当ページとコンテキストを追加"""
+        if not snippets or "error" in snippets:
+            error = snippets["error"] if snippets else "インデックスに登録されていません"
+            detail_text.insert(tk.END, f"\nコンテキストを取得できませんでした: {error}\n")
+            return
+        if snippets.get('pages'):
+            pages_text = ", ".join(str(page_no) for page_no in snippets['pages'])
+            detail_text.insert(tk.END, f"該当ページ: {pages_text}\n")
+        detail_text.insert(tk.END, "\nコンテキスト:\n")
+        context_start = detail_text.index("end-1c")
+        detail_text.insert(tk.END, f"{snippets['context']}\n")
+        # 検索時に求めたキーワードの位置を強調表示（改めて検索はしない）
+        for start, end in snippets.get('highlights', []):
+            detail_text.tag_add("highlight", f"{context_start}+{start}c", f"{context_start}+{end}c")
+
+    # 実行中の検索（新しい検索を始めたら前の検索は中断する）
+    search_state = {
+        "token": 0,  # 最新の検索の番号（古い検索の結果は表示しない）
+        "cancel": None,
+        "after_id": None,  # 入力中の検索を始める予約
+        "previous_query": None,  # 絞り込みに使う直前の検索語
+        "last_text": "",  # 直前に入力されていた内容
+        "query": ("", False, ""),  # 表示している結果の検索語と検索方法（コンテキストの取得用）
+        "start_time": 0.0
+    }
+    search_results = Queue()
+
+    def cancel_search():
+        """実行中の検索と、予約済みの入力中の検索を取り消す"""
+        if search_state["after_id"]:
+            root.after_cancel(search_state["after_id"])
+            search_state["after_id"] = None
+        if search_state["cancel"]:
+            search_state["cancel"].set()
+            search_state["cancel"] = None
+
+    def run_search_worker(token: int, cancel_event: threading.Event, query: str, exact_match: bool,
+                          include_subfolders: bool, pattern_mode: str, refine_from: Optional[str],
+                          filters: Dict):
+        """バックグラウンドで検索し、結果を画面用のキューに送る"""
+        system = search_system
+        if system is None:
+            return  # 検索システムを閉じている間（終了時や設定の変更時。検索は取り消し済み）
+        try:
+            for result in system.iter_search(query, exact_match=exact_match,
+                                             include_subfolders=include_subfolders,
+                                             cancel_event=cancel_event, refine_from=refine_from,
+                                             details=False, pattern_mode=pattern_mode,
+                                             filters=filters):
+                search_results.put((token, "result", result))
+            search_results.put((token, "done", None))
+        except ValueError as e:
+            # 正しくない正規表現（入力中の検索ではよくあるので、メッセージボックスは出さない）
+            search_results.put((token, "invalid", e))
+        except (OSError, sqlite3.Error) as e:
+            # 検索サーバーに接続できない場合や、DBがロックされている場合など
+            search_results.put((token, "error", e))
+
+    def show_search_results():
+        """バックグラウンドの検索結果をリストに追加（画面が固まらないよう1回に追加する件数を制限）"""
+        for _ in range(200):
+            try:
+                token, kind, value = search_results.get_nowait()
+            except Empty:
+                break
+            if token != search_state["token"]:
+                continue  # 中断した検索の結果
+            if kind == "result":
+                result_list.append(value)
+                result_count_label.config(text=f"検索中... {result_list.size()}件")
+            elif kind == "snippets":
+                file_path, snippets = value
+                if snippets and "error" not in snippets:
+                    detail_cache[file_path] = snippets
+                    if len(detail_cache) > DETAIL_CACHE_SIZE:
+                        detail_cache.popitem(last=False)
+                selected_result = result_list.selected_item()
+                if selected_result and selected_result['file_path'] == file_path:
+                    if detail_text.tag_ranges("loading"):
+                        detail_text.delete("loading.first", "loading.last")
+                    show_snippets(snippets)
+            elif kind == "invalid":
+                search_state["cancel"] = None
+                result_count_label.config(text=str(value))
+            elif kind == "error":
+                search_state["cancel"] = None
+                result_count_label.config(text="")
+                if isinstance(value, sqlite3.Error):
+                    messagebox.showerror("エラー", f"検索中にエラーが発生しました: {value}")
+                else:
+                    # 検索サーバーを使う設定で、サーバーに接続できない場合
+                    messagebox.showerror("エラー", f"検索サーバーに接続できませんでした: {value}")
+            else:
+                search_state["cancel"] = None
+                if not result_list.size():
+                    result_count_label.config(text="検索結果が見つかりませんでした。")
+                else:
+                    search_time = time.time() - search_state["start_time"]
+                    result_count_label.config(text=f"検索結果: {result_list.size()}件 ({search_time:.2f}秒)")
+        root.after(50, show_search_results)
+
+    def perform_search(interactive: bool = False):
+        """検索を実行（入力中の検索では、直前の検索を延長した語なら前の結果から絞り込む）"""
+        cancel_search()
         original_query = search_entry.get()
-        if not original_query:
-            messagebox.showwarning("警告", "検索語を入力してください")
+        if not original_query.strip():
+            if not interactive:
+                messagebox.showwarning("警告", "検索語を入力してください")
             return
-        
-        # 完全一致検索で1語の場合、前後にスペースを追加（内部処理用）
-        query = original_query
-        if exact_match_var.get():
-            # スペースで分割して単語数をカウント（連続スペースは1つとして扱う）
-            words = [w for w in query.split() if w]
-            if len(words) == 1:  # 1語の場合のみ
-                query = f" {words[0]} "  # 元の入力形式に関係なく、必ずスペースを追加
-        
-        start_time = time.time()
-        file_listbox.delete(0, tk.END)
+        if search_system is None:
+            return
+
+        exact_match = exact_match_var.get()
+        include_subfolders = include_subfolders_search_var.get()
+        pattern_mode = pattern_modes.get(pattern_mode_var.get(), "")
+        try:
+            filters = get_search_filters()
+        except ValueError as e:
+            if interactive:
+                result_count_label.config(text=str(e))
+            else:
+                messagebox.showwarning("警告", str(e))
+            return
+        query = original_query if pattern_mode else prepare_query(original_query, exact_match)
+        previous = search_state["previous_query"]
+        refine_from = None
+        if interactive and previous and previous[1:] == (exact_match, include_subfolders, pattern_mode, filters):
+            refine_from = previous[0]
+        search_state["previous_query"] = (query, exact_match, include_subfolders, pattern_mode, filters)
+
+        search_state["token"] += 1
+        search_state["cancel"] = threading.Event()
+        search_state["start_time"] = time.time()
+        search_state["query"] = (query, exact_match, pattern_mode)
+        result_list.clear()
         detail_text.delete('1.0', tk.END)
-        results_dict.clear()
-        
-        results = search_system.search(
-            query, 
-            exact_match=exact_match_var.get(),
-            include_subfolders=include_subfolders_search_var.get()
-        )
+        detail_cache.clear()
+        result_count_label.config(text="検索中...")
+
+        threading.Thread(
+            target=run_search_worker,
+            args=(search_state["token"], search_state["cancel"], query,
+                  exact_match, include_subfolders, pattern_mode, refine_from, filters),
+            daemon=True
+        ).start()
 
-        if not results:
-            result_count_label.config(text="検索結果が見つかりませんでした。")
+    def on_search_entry_key(event=None):
+        """入力中の検索: 入力が止まってから検索する（入力のたびに前の検索は中断する）"""
+        if not search_as_you_type_var.get() or event.keysym in ("Return", "KP_Enter"):
             return
-        
-        search_time = time.time() - start_time
-        result_count_label.config(text=f"検索結果: {len(results)}件 ({search_time:.2f}秒)")
-        
-        for i, result in enumerate(results):
-            file_listbox.insert(tk.END, result['file_name'])
-            results_dict[i] = result
+        if search_entry.get() == search_state["last_text"]:
+            return  # カーソル移動など、入力内容が変わらないキー
+        search_state["last_text"] = search_entry.get()
+        cancel_search()
+        delay = settings.get_setting("search_as_you_type_delay_ms") or 300
+        search_state["after_id"] = root.after(delay, lambda: perform_search(interactive=True))
+
+    def save_search_as_you_type():
+        settings.update_setting("search_as_you_type", search_as_you_type_var.get())
 
     def clear_search_entry():
         """検索窓の入力値をクリア"""
@@ -796,6 +3815,38 @@ def main():
     def start_indexing_after_config():
         """検索システムの初期化とインデックス作成の開始"""
         nonlocal search_system
+        cancel_search()
+        search_state["previous_query"] = None
+        if search_system:
+            # 前の設定で実行中のインデックス作成は、コミット済みの分を残して中断
+            # （子プロセスの終了を待つ間も画面が固まらないよう、別スレッドで閉じてから新しく開始する）
+            closing_thread = threading.Thread(target=search_system.close, daemon=True)
+            search_system = None
+            closing_thread.start()
+            progress_label.config(text="前のインデックス作成を停止中...")
+            progress_frame.pack(fill='x', pady=(0, 10))
+            wait_for_close(closing_thread, start_search_system)
+            return
+        start_search_system()
+
+    def wait_for_close(closing_thread: threading.Thread, on_closed):
+        """前の検索システムを閉じ終わるまで画面の処理を止めずに待ち、閉じ終わったらon_closedを呼ぶ"""
+        if closing_thread.is_alive():
+            root.after(100, lambda: wait_for_close(closing_thread, on_closed))
+        else:
+            on_closed()
+
+    def start_search_system():
+        """現在の設定で検索システムを作成し、インデックス作成を開始する"""
+        nonlocal search_system
+        # 検索サーバーを使う場合は、インデックスの作成も検索もサーバーに任せる
+        server_url = settings.get_setting("server_url")
+        if server_url:
+            search_system = SearchServiceClient(server_url)
+            progress_label.config(text="検索サーバーに接続中...")
+            root.after(100, update_progress)
+            return
+
         search_system = PDFSearchSystem(settings)
         
         # 設定が空の場合は設定画面を表示
@@ -806,14 +3857,14 @@ def main():
             
         progress_label.config(text="インデックス作成の準備中...")
         progress_label.update()
-        import_thread = threading.Thread(target=lambda: import_pdf_module(search_system))
-        import_thread.daemon = True
-        import_thread.start()
+        # インデックス作成は別プロセスで行い、画面の操作が重くならないようにする
+        search_system.start_background_indexing()
         root.after(100, update_progress)
 
     # 設定の初期化
     settings = Settings()
     search_system = None
+    search_as_you_type_var.set(bool(settings.get_setting("search_as_you_type")))
 
     # 初回起動時も含め自動的に設定読み込みとインデックス作成を開始
     start_indexing_after_config()
@@ -842,6 +3893,54 @@ def main():
         command=lambda: save_settings_as()
     )
 
+    # 表示メニュー
+    view_menu = tk.Menu(menubar, tearoff=0)
+    menubar.add_cascade(label="表示", menu=view_menu)
+    view_menu.add_command(
+        label="抽出に時間がかかったファイル",
+        command=lambda: show_slowest_files()
+    )
+
+    # テキスト抽出に時間がかかったファイルの一覧（除外や抽出方式の見直し用）
+    def show_slowest_files():
+        try:
+            slowest = search_system.get_slowest_files(50) if search_system else []
+        except OSError as e:
+            messagebox.showerror("エラー", f"検索サーバーに接続できませんでした: {e}")
+            return
+        if not slowest:
+            messagebox.showinfo("情報", "テキスト抽出の記録がありません")
+            return
+
+        window = tk.Toplevel(root)
+        window.title("抽出に時間がかかったファイル")
+        window.geometry("900x400")
+        columns = ("wall", "cpu", "pages", "size", "extractor", "tier", "status", "file")
+        headings = ("時間(秒)", "CPU(秒)", "ページ", "サイズ(KB)", "抽出方法", "方式", "状態", "ファイル")
+        status_labels = {"complete": "", "partial": "一部のみ登録", "skipped": "登録を見送り"}
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            tree.heading(column, text=heading)
+            tree.column(column, width=400 if column == "file" else 70, anchor=tk.W if column == "file" else tk.E)
+        for stats in slowest:
+            extractor = stats["extractor"] or "失敗"
+            if stats["fallback"]:
+                extractor += "（代替）"
+            tree.insert("", tk.END, values=(
+                f"{stats['wall_seconds'] or 0:.2f}",
+                f"{stats['cpu_seconds'] or 0:.2f}",
+                stats["pages"],
+                (stats["bytes_in"] or 0) // 1024,
+                extractor,
+                stats["tier"],
+                status_labels.get(stats["status"]) or "",
+                stats["file_path"]
+            ))
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
     # 設定ファイルを開く
     def load_settings_file():
         file_path = filedialog.askopenfilename(
@@ -883,13 +3982,275 @@ def main():
     tk.Button(button_frame, text="結果を保存", command=save_results).pack(side='left', padx=(0, 5))
     tk.Button(button_frame, text="削除", command=clear_search_entry).pack(side='left')
 
+    def on_close():
+        """終了時は実行中のインデックス作成を中断し、処理済みの分をコミットしてから閉じる
+
+        大きなファイルの抽出の終了を待つ間も画面が固まらないよう、ウィンドウを先に隠し、別スレッドで閉じる
+        """
+        nonlocal search_system
+        cancel_search()
+        if not search_system:
+            root.destroy()
+            return
+        closing_system = search_system
+        search_system = None
+        root.withdraw()
+
+        def close_search_system():
+            closing_system.stop_indexing()
+            closing_system.indexing_complete.wait(timeout=10)
+            closing_system.close()
+
+        closing_thread = threading.Thread(target=close_search_system, daemon=True)
+        closing_thread.start()
+        wait_for_close(closing_thread, root.destroy)
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+    root.after(50, show_search_results)
+
     # バインディング
     search_entry.bind('<Return>', lambda event: perform_search())
-    file_listbox.bind('<Return>', open_selected_pdf)
-    file_listbox.bind('<Double-Button-1>', open_selected_pdf)
-    file_listbox.bind('<<ListboxSelect>>', show_file_details)
+    search_entry.bind('<KeyRelease>', on_search_entry_key)
+    result_list.bind('<<ResultOpen>>', open_selected_pdf)
+    result_list.bind('<<ResultSelect>>', show_file_details)
 
     root.mainloop()
 
+def _load_cli_settings(args) -> Settings:
+    """コマンドライン引数から設定を読み込む（コマンドラインでの指定は設定ファイルには保存しない）"""
+    settings = Settings()
+    if args.settings and not settings.load_settings_from_file(args.settings, remember=False):
+        raise SystemExit(f"設定ファイルを読み込めません: {args.settings}")
+    for key, value in (("pdf_folder", args.pdf_folder), ("db_folder", args.db_folder)):
+        if value:
+            settings.settings[key] = value
+    if not settings.get_setting("pdf_folder") or not settings.get_setting("db_folder"):
+        raise SystemExit("PDFフォルダーとインデックスDBフォルダーを設定するか、--pdf-folder と --db-folder を指定してください")
+    return settings
+
+def _print_json(data: Dict):
+    """1行のJSONとして標準出力に書き出す（JSON Lines）"""
+    print(json.dumps(data, ensure_ascii=False), flush=True)
+
+def _cli_index(args) -> int:
+    """indexサブコマンド: インデックスを作成し、処理速度を表示する"""
+    settings = _load_cli_settings(args)
+    if args.workers is not None:
+        settings.settings["index_workers"] = args.workers
+    if args.subfolders:
+        settings.settings["include_subfolders_index"] = True
+    search_system = PDFSearchSystem(settings)
+
+    # 標準出力は結果のJSON用に空けておき、処理中のメッセージは標準エラーに出す
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    start_time = time.time()
+    thread = threading.Thread(target=import_pdf_module, args=(search_system,), daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(timeout=1.0)
+            # 前の行より短くなった場合に残る文字は空白で消す
+            print(f"\r{format_progress(search_system.indexing_progress)}    ",
+                  end="", file=sys.stderr, flush=True)
+        print(file=sys.stderr)
+
+        if args.watch:
+            print("PDFフォルダーの監視を開始します（Ctrl+Cで終了）", file=sys.stderr)
+            watch_pdf_folder(search_system)
+    except KeyboardInterrupt:
+        # 処理済みの分をコミットしてから終了する
+        print("\n中断しています...", file=sys.stderr)
+        search_system.stop_indexing()
+        thread.join()
+    finally:
+        sys.stdout = stdout
+        search_system.close()
+
+    elapsed = time.time() - start_time
+    report = search_system.change_report or {"added": [], "changed": [], "deleted": [], "unchanged": 0}
+    extracted = len(report["added"]) + len(report["changed"])
+    _print_json({
+        "added": len(report["added"]),
+        "changed": len(report["changed"]),
+        "deleted": len(report["deleted"]),
+        "unchanged": report["unchanged"],
+        "elapsed_seconds": round(elapsed, 3),
+        "files_per_second": round(extracted / elapsed, 3) if elapsed > 0 else 0.0
+    })
+    return 0
+
+def _cli_filters(args) -> Dict:
+    """検索の絞り込みのオプションを、iter_searchのfiltersに変換する（誤りがあれば終了）"""
+    filters = {name: getattr(args, name) for name in SEARCH_FILTERS if getattr(args, name) is not None}
+    try:
+        normalize_search_filters(filters)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    return filters
+
+def _cli_search(args) -> int:
+    """searchサブコマンド: 検索結果をJSON Linesで1件ずつ出力する"""
+    filters = _cli_filters(args)
+    search_system = PDFSearchSystem(_load_cli_settings(args))
+    try:
+        query = args.query if args.pattern_mode else prepare_query(args.query, args.exact)
+        for result in search_system.iter_search(query, args.exact, args.subfolders, args.limit or None,
+                                                pattern_mode=args.pattern_mode, filters=filters):
+            _print_json(result)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    finally:
+        search_system.close()
+    return 0
+
+def _cli_batch(args) -> int:
+    """batchサブコマンド: ファイルに書かれた検索語を1行ずつ、同じ接続で続けて検索する"""
+    filters = _cli_filters(args)
+    search_system = PDFSearchSystem(_load_cli_settings(args))
+    query_file = sys.stdin if args.file == "-" else open(args.file, "r", encoding="utf-8")
+    try:
+        for line in query_file:
+            original_query = line.rstrip("\n")
+            if not original_query.strip():
+                continue
+            start_time = time.perf_counter()
+            query = original_query if args.pattern_mode else prepare_query(original_query, args.exact)
+            try:
+                results = search_system.search(query, args.exact, args.subfolders, args.limit or None,
+                                               pattern_mode=args.pattern_mode, filters=filters)
+            except ValueError as e:
+                _print_json({"query": original_query, "error": str(e)})
+                continue
+            output = {
+                "query": original_query,
+                "count": len(results),
+                "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 3)
+            }
+            if not args.no_results:
+                output["results"] = results
+            _print_json(output)
+    finally:
+        if query_file is not sys.stdin:
+            query_file.close()
+        search_system.close()
+    return 0
+
+def _cli_serve(args) -> int:
+    """serveサブコマンド: インデックスを作成・監視しながら、検索サーバーとして待ち受ける"""
+    settings = _load_cli_settings(args)
+    host = args.host or settings.get_setting("server_host") or "127.0.0.1"
+    port = args.port or settings.get_setting("server_port") or 8765
+    search_system = PDFSearchSystem(settings)
+
+    if args.no_index:
+        search_system.indexing_complete.set()
+    else:
+        # インデックスの作成とフォルダーの監視はサーバーの1か所だけで、検索に応答するプロセスとは別に行う
+        search_system.start_background_indexing()
+
+    server = serve_search_system(search_system, host, port)
+    print(f"検索サーバーを起動しました: http://{host}:{server.server_address[1]}（Ctrl+Cで終了）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n終了しています...", file=sys.stderr)
+    finally:
+        server.server_close()
+        search_system.stop_indexing()
+        search_system.indexing_complete.wait(timeout=10)
+        search_system.close()
+    return 0
+
+def _cli_maintain(args) -> int:
+    """maintainサブコマンド: インデックスDBのメンテナンスを行い、結果をJSONで出力する"""
+    search_system = PDFSearchSystem(_load_cli_settings(args))
+    try:
+        if not search_system.db_path.exists():
+            raise SystemExit(f"インデックスDBがありません: {search_system.db_path}")
+        _print_json(maintain_database(search_system.db_path, full_vacuum=args.full))
+    finally:
+        search_system.close()
+    return 0
+
+def _cli_slowest(args) -> int:
+    """slowestサブコマンド: テキスト抽出に時間がかかったファイルをJSON Linesで出力する"""
+    search_system = PDFSearchSystem(_load_cli_settings(args))
+    try:
+        for stats in search_system.get_slowest_files(args.top):
+            _print_json(stats)
+    finally:
+        search_system.close()
+    return 0
+
+def cli_main(argv: List[str]) -> int:
+    """コマンドラインから使う場合の入口（画面を表示せずにインデックス作成・検索を行う）"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="pdf-search.py", description="PDF検索システム（コマンドライン）")
+    parser.add_argument("--settings", help="使用する設定ファイル（省略時は前回の設定）")
+    parser.add_argument("--pdf-folder", help="PDF検索フォルダー（設定より優先）")
+    parser.add_argument("--db-folder", help="インデックスDBフォルダー（設定より優先）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="インデックスを作成・更新する")
+    index_parser.add_argument("--workers", type=int, help="テキスト抽出の並列プロセス数（0は自動）")
+    index_parser.add_argument("--subfolders", action="store_true", help="サブフォルダーもインデックスに含める")
+    index_parser.add_argument("--watch", action="store_true", help="作成後もフォルダーを監視し続ける")
+    index_parser.set_defaults(handler=_cli_index)
+
+    def add_search_options(subparser):
+        subparser.add_argument("--exact", action="store_true", help="完全一致検索")
+        subparser.add_argument("--subfolders", action="store_true", help="サブフォルダーも検索する")
+        subparser.add_argument("--limit", type=int, default=0, help="関連度の高い順に出力する件数（0は設定の上限まで）")
+        mode_group = subparser.add_mutually_exclusive_group()
+        mode_group.add_argument("--regex", dest="pattern_mode", action="store_const", const="regex", default="",
+                                help="検索語を正規表現として扱う")
+        mode_group.add_argument("--wildcard", dest="pattern_mode", action="store_const", const="wildcard",
+                                help="検索語をワイルドカード（* と ?）として扱う")
+        filter_group = subparser.add_argument_group("絞り込み（日付は 2024-04-01、2024-04、2024 の形式）")
+        filter_group.add_argument("--modified-after", dest="modified_after", help="この日以降に更新されたファイル")
+        filter_group.add_argument("--modified-before", dest="modified_before", help="この日までに更新されたファイル")
+        filter_group.add_argument("--created-after", dest="created_after", help="この日以降に作成されたPDF（文書情報の作成日）")
+        filter_group.add_argument("--created-before", dest="created_before", help="この日までに作成されたPDF（文書情報の作成日）")
+        filter_group.add_argument("--min-pages", dest="min_pages", type=int, help="ページ数の下限")
+        filter_group.add_argument("--max-pages", dest="max_pages", type=int, help="ページ数の上限")
+        filter_group.add_argument("--min-size", dest="min_size", type=int, help="ファイルサイズの下限（バイト）")
+        filter_group.add_argument("--max-size", dest="max_size", type=int, help="ファイルサイズの上限（バイト）")
+        filter_group.add_argument("--folder", help="このフォルダー（PDFフォルダーからの相対パス）とサブフォルダーのファイル")
+        filter_group.add_argument("--author", help="作成者に含まれる文字列")
+        filter_group.add_argument("--title", help="タイトルに含まれる文字列")
+
+    search_parser = subparsers.add_parser("search", help="検索し、結果をJSON Linesで出力する")
+    search_parser.add_argument("query", help="検索語")
+    add_search_options(search_parser)
+    search_parser.set_defaults(handler=_cli_search)
+
+    batch_parser = subparsers.add_parser("batch", help="ファイルの各行の検索語で続けて検索する")
+    batch_parser.add_argument("file", help="検索語を1行に1つ書いたファイル（-で標準入力）")
+    batch_parser.add_argument("--no-results", action="store_true", help="件数と所要時間だけを出力する")
+    add_search_options(batch_parser)
+    batch_parser.set_defaults(handler=_cli_batch)
+
+    slowest_parser = subparsers.add_parser("slowest", help="テキスト抽出に時間がかかったファイルを表示する")
+    slowest_parser.add_argument("--top", type=int, default=20, help="表示する件数")
+    slowest_parser.set_defaults(handler=_cli_slowest)
+
+    maintain_parser = subparsers.add_parser("maintain", help="インデックスDBを最適化し、空き領域を解放する")
+    maintain_parser.add_argument("--full", action="store_true", help="VACUUMでDB全体を作り直す")
+    maintain_parser.set_defaults(handler=_cli_maintain)
+
+    serve_parser = subparsers.add_parser("serve", help="検索サーバーとして起動する")
+    serve_parser.add_argument("--host", help="待ち受けるアドレス（他のPCから使う場合は 0.0.0.0）")
+    serve_parser.add_argument("--port", type=int, help="待ち受けるポート番号")
+    serve_parser.add_argument("--no-index", action="store_true", help="インデックスを作成せず、既存のDBで検索だけ行う")
+    serve_parser.set_defaults(handler=_cli_serve)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(cli_main(sys.argv[1:]))
     main()
\ No newline at end of file
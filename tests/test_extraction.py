@@ -0,0 +1,62 @@
+"""テキスト抽出の回帰テスト（python -m unittest discover -s tests で実行）"""
+import importlib.util
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+def load_pdf_search():
+    """pdf-search.py をモジュールとして読み込む（ファイル名にハイフンがあるためimportできない）"""
+    path = Path(__file__).resolve().parent.parent / "pdf-search.py"
+    spec = importlib.util.spec_from_file_location("pdf_search", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["pdf_search"] = module
+    spec.loader.exec_module(module)
+    return module
+
+pdf_search = load_pdf_search()
+
+def failing_extractors(pypdf_pages=None):
+    """pdfplumberが必ず失敗し、pypdfはpypdf_pages（Noneなら失敗）を返す抽出ライブラリに差し替える"""
+    def open_pdf(path):
+        raise ValueError("pdfplumber: broken file")
+
+    class PdfReader:
+        def __init__(self, path):
+            if pypdf_pages is None:
+                raise ValueError("pypdf: broken file")
+            self.metadata = {}
+            self.pages = [types.SimpleNamespace(extract_text=lambda text=text: text) for text in pypdf_pages]
+
+    return mock.patch.dict(sys.modules, {"pdfplumber": types.SimpleNamespace(open=open_pdf),
+                                         "pypdf": types.SimpleNamespace(PdfReader=PdfReader)})
+
+class ExtractionFailureTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.pdf_path = Path(directory.name) / "broken.pdf"
+        self.pdf_path.write_bytes(b"%PDF-1.4 not really a pdf")
+
+    def test_both_extractors_failing_is_an_error(self):
+        # どちらの方法でも読めないファイルは、登録されずに次回も再試行されるようエラーとして返す
+        for tier in ("fast", "full"):
+            with self.subTest(tier=tier), failing_extractors():
+                path, pages, error, stats = pdf_search._extract_text_worker((str(self.pdf_path), tier, {}))
+                self.assertEqual(path, str(self.pdf_path))
+                self.assertEqual(pages, [])
+                self.assertIsNotNone(error)
+                self.assertIsNone(stats["extractor"])
+
+    def test_pypdf_fallback_after_pdfplumber_failure_succeeds(self):
+        with failing_extractors(["Page One", "page two"]):
+            _, pages, error, stats = pdf_search._extract_text_worker((str(self.pdf_path), "full", {}))
+        self.assertIsNone(error)
+        self.assertEqual(pages, ["page one", "page two"])
+        self.assertEqual(stats["extractor"], "pypdf")
+        self.assertTrue(stats["fallback"])
+
+if __name__ == "__main__":
+    unittest.main()
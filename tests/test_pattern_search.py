@@ -0,0 +1,22 @@
+"""パターン検索の検索語の検証の回帰テスト（python -m unittest discover -s tests で実行）"""
+import unittest
+
+from test_extraction import pdf_search
+
+class BuildSearchRegexTest(unittest.TestCase):
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            pdf_search.build_search_regex("abc", "foo")
+
+    def test_wildcard_of_only_stars_is_rejected(self):
+        # 空のパターンはすべてのページに一致してしまうため受け付けない
+        for query in ("*", "**", " * "):
+            with self.subTest(query=query), self.assertRaises(ValueError):
+                pdf_search.build_search_regex(query, "wildcard")
+
+    def test_valid_patterns_are_accepted(self):
+        self.assertEqual(pdf_search.build_search_regex("a*b", "wildcard"), "a.*b")
+        self.assertEqual(pdf_search.build_search_regex(r"AB-\d{4}", "regex"), r"ab-\d{4}")
+
+if __name__ == "__main__":
+    unittest.main()